@@ -2,9 +2,12 @@ from flask import Flask
 
 from  .routes.auth_route import auth_bp
 from .routes.user_route import user_bp
-from .routes.recomendation_route import recommendation_bp
+from .routes.recomendation_route import recommendation_bp, diet_service
+from .routes.health_route import health_bp
 from .routes.dailyLogs_route import food_bp
+from .routes.dashboard_route import dashboard_bp
 from .extensions import mongo,bcrypt,jwt
+from .services.esp32_service import weight_poller
 from  .config import Config
 
 
@@ -20,7 +23,61 @@ def create_app():
     app.register_blueprint(user_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(food_bp)
+    app.register_blueprint(dashboard_bp)
     app.register_blueprint(recommendation_bp)
+    app.register_blueprint(health_bp)
 
+    # Model rekomendasi dimuat di background supaya create_app tidak menunggu torch/pandas/pickle
+    if diet_service.load_mode == "background":
+        diet_service.start_loading()
+
+    # Polling timbangan ESP32 di background (jika dikonfigurasi)
+    if weight_poller is not None:
+        weight_poller.start()
+
+    # Verifikasi/buat index MongoDB saat startup (opsional, bisa juga lewat `flask ensure-indexes`)
+    if app.config.get('ENSURE_INDEXES_ON_STARTUP'):
+        from .services.index_service import ensure_indexes
+        try:
+            for entry in ensure_indexes(mongo.db):
+                if entry['status'] not in ('ok', 'created'):
+                    print(f"Index {entry['collection']}.{entry['name']}: {entry['status']} {entry['detail']}")
+        except Exception as e:
+            print(f"Gagal memastikan index MongoDB: {e}")
+
+    register_commands(app)
 
     return app
+
+
+def register_commands(app):
+    @app.cli.command("convert-recipes")
+    def convert_recipes():
+        """Konversi {meal}_data.pkl ke layout array memory-mapped ({meal}_store/)."""
+        import os
+        from .services.recipe_store import convert_meal_dataset
+
+        for meal in diet_service.meals:
+            meta = convert_meal_dataset(
+                os.path.join(diet_service.artifacts_dir, f'{meal}_data.pkl'),
+                os.path.join(diet_service.artifacts_dir, f'{meal}_store')
+            )
+            print(f"{meal}: {meta['rows']} resep, pickle {meta['pickle_memory_bytes']} B -> store {meta['store_bytes']} B (shared)")
+
+    @app.cli.command("ensure-indexes")
+    def ensure_indexes_command():
+        """Buat index MongoDB yang belum ada dan tampilkan statusnya."""
+        from .services.index_service import ensure_indexes
+
+        for entry in ensure_indexes(mongo.db):
+            detail = f" ({entry['detail']})" if entry['detail'] else ""
+            print(f"{entry['collection']}.{entry['name']}: {entry['status']}{detail}")
+
+    @app.cli.command("backfill-rollups")
+    def backfill_rollups_command():
+        """Bangun ulang weekly_summaries & monthly_summaries dari daily_logs."""
+        from .services.rollup_service import backfill_rollups
+
+        for collection, counts in backfill_rollups().items():
+            print(f"{collection}: {counts['written']} ditulis, {counts['deleted']} dihapus, "
+                  f"{counts['skipped_live']} dilewati karena berubah selama backfill")
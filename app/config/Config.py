@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import  timedelta
 
 class Config:
@@ -7,9 +8,123 @@ class Config:
     ESP32_IP = os.getenv('ESP32_IP')
     ESP32_API_KEY = os.getenv("ESP32_API_KEY")
     ESP32_URL = f"http://{ESP32_IP}/getWeight" if ESP32_IP else None
+    # Polling timbangan di background; analyze_food hanya membaca bacaan stabil terakhir
+    ESP32_POLL_INTERVAL = float(os.getenv("ESP32_POLL_INTERVAL", 0.5))
+    ESP32_READ_TIMEOUT = float(os.getenv("ESP32_READ_TIMEOUT", 2))
+    ESP32_STABLE_READINGS = int(os.getenv("ESP32_STABLE_READINGS", 3))
+    ESP32_STABLE_DELTA = float(os.getenv("ESP32_STABLE_DELTA", 2))
+    ESP32_MAX_READING_AGE = float(os.getenv("ESP32_MAX_READING_AGE", 5))
+    # Isi untuk memakai timbangan stub (tanpa device), mis. ESP32_STUB_WEIGHT=50
+    ESP32_STUB_WEIGHT = float(os.environ["ESP32_STUB_WEIGHT"]) if os.getenv("ESP32_STUB_WEIGHT") else None
 
     CALORIE_NINJA_API_URL = os.getenv("CALORIE_NINJA_API_URL")
     CALORIE_NINJA_API_KEY = os.getenv("CALORIE_NINJA_API_KEY")
     JWT_SECRET_KEY = "ini rahasia"
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=7)
+    # Claim ringkas {pv, tgt} di access token (lihat user_service.get_user_targets).
+    # Claim hanya dipakai jika worker ini sudah pernah melihat profile_version user dan
+    # claim tidak lebih lama. Jika profil diubah lewat worker lain, worker ini baru tahu
+    # setelah memuat ulang profil, jadi claim lama bisa terpakai paling lama
+    # PROFILE_CLAIM_MAX_AGE detik sejak token dibuat.
+    JWT_EMBED_PROFILE_CLAIMS = os.getenv("JWT_EMBED_PROFILE_CLAIMS", "false").lower() == "true"
+    PROFILE_CLAIM_MAX_AGE = int(os.getenv("PROFILE_CLAIM_MAX_AGE", 900))
+    PROFILE_VERSION_CACHE_SIZE = int(os.getenv("PROFILE_VERSION_CACHE_SIZE", 100000))
+    PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 10000))
+    PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", 300))
 
+    # Cache hasil /api/recommendation (input dibulatkan ke bucket)
+    RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", 1024))
+    RECOMMENDATION_CACHE_TTL = int(os.getenv("RECOMMENDATION_CACHE_TTL", 6 * 60 * 60))
+    RECOMMENDATION_CACHE_AGE_BUCKET = float(os.getenv("RECOMMENDATION_CACHE_AGE_BUCKET", 1))
+    RECOMMENDATION_CACHE_WEIGHT_BUCKET = float(os.getenv("RECOMMENDATION_CACHE_WEIGHT_BUCKET", 0.5))
+    RECOMMENDATION_CACHE_HEIGHT_BUCKET = float(os.getenv("RECOMMENDATION_CACHE_HEIGHT_BUCKET", 0.01))
+
+    # Endpoint /api/recommendation/batch
+    RECOMMENDATION_BATCH_MAX_SIZE = int(os.getenv("RECOMMENDATION_BATCH_MAX_SIZE", 200))
+    RECOMMENDATION_BATCH_WORKERS = int(os.getenv("RECOMMENDATION_BATCH_WORKERS", 4))
+
+    # Engine pencarian per set constraint diet/nutrisi
+    CONSTRAINED_ENGINE_CACHE_SIZE = int(os.getenv("CONSTRAINED_ENGINE_CACHE_SIZE", 64))
+
+    # Rencana multi-hari (days=N): batas hari dan default pemakaian ulang resep per meal
+    MEAL_PLAN_MAX_DAYS = int(os.getenv("MEAL_PLAN_MAX_DAYS", 14))
+    MEAL_PLAN_MAX_REPEAT = int(os.getenv("MEAL_PLAN_MAX_REPEAT", 1))
+
+    # Target per meal dari rencana yang sudah dibuat, untuk /api/recommendation/replan (plan_id).
+    # LRU per proses di depan koleksi MongoDB recommendation_plans (TTL index di expires_at)
+    PLAN_STORE_SIZE = int(os.getenv("PLAN_STORE_SIZE", 10000))
+    PLAN_STORE_TTL = int(os.getenv("PLAN_STORE_TTL", 6 * 60 * 60))
+    # Batas tulis plan ke MongoDB yang mengantre di thread background (MongoDB lambat/mati)
+    PLAN_STORE_MAX_PENDING_WRITES = int(os.getenv("PLAN_STORE_MAX_PENDING_WRITES", 1000))
+
+    # Micro-batching inference model antar request yang bersamaan
+    INFERENCE_BATCHING_ENABLED = os.getenv("INFERENCE_BATCHING_ENABLED", "false").lower() == "true"
+    INFERENCE_BATCH_MAX_SIZE = int(os.getenv("INFERENCE_BATCH_MAX_SIZE", 32))
+    INFERENCE_BATCH_MAX_WAIT_MS = float(os.getenv("INFERENCE_BATCH_MAX_WAIT_MS", 2))
+
+    # Tabel target nutrisi per meal (interpolasi dari grid kalori, tanpa torch per request)
+    NUTRIENT_LUT_ENABLED = os.getenv("NUTRIENT_LUT_ENABLED", "false").lower() == "true"
+    NUTRIENT_LUT_MIN = float(os.getenv("NUTRIENT_LUT_MIN", 300))
+    NUTRIENT_LUT_MAX = float(os.getenv("NUTRIENT_LUT_MAX", 2000))
+    NUTRIENT_LUT_STEP = float(os.getenv("NUTRIENT_LUT_STEP", 1))
+    NUTRIENT_LUT_TOLERANCE = float(os.getenv("NUTRIENT_LUT_TOLERANCE", 0.001))
+
+    # Backend inference: "torch" (referensi/training) atau "numpy" (tanpa import torch)
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+    INFERENCE_BACKEND_PARITY_CHECK = os.getenv("INFERENCE_BACKEND_PARITY_CHECK", "false").lower() == "true"
+    INFERENCE_BACKEND_PARITY_TOLERANCE = float(os.getenv("INFERENCE_BACKEND_PARITY_TOLERANCE", 1e-4))
+
+    # Load model rekomendasi: "eager" (saat import), "background" (thread saat create_app), "lazy" (request pertama)
+    MODEL_LOAD_MODE = os.getenv("MODEL_LOAD_MODE", "background")
+    MODEL_RETRY_AFTER = int(os.getenv("MODEL_RETRY_AFTER", 5))
+
+    # Format dataset resep: "pickle" (DataFrame) atau "mmap" (array float32 memory-mapped, lihat recipe_store.py)
+    RECIPE_DATA_FORMAT = os.getenv("RECIPE_DATA_FORMAT", "pickle")
+
+    # Cache nutrisi per gram untuk lookup CalorieNinjas (LRU in-process + koleksi nutrition_cache)
+    NUTRITION_CACHE_SIZE = int(os.getenv("NUTRITION_CACHE_SIZE", 2048))
+    NUTRITION_CACHE_TTL = int(os.getenv("NUTRITION_CACHE_TTL", 60 * 60))
+    NUTRITION_CACHE_DB_TTL_DAYS = int(os.getenv("NUTRITION_CACHE_DB_TTL_DAYS", 30))
+    # remote_first | local_first | local_only | remote_only (lihat nutrition_service)
+    NUTRITION_SOURCE_POLICY = os.getenv("NUTRITION_SOURCE_POLICY", "remote_first")
+    LOCAL_FOOD_TABLE = os.getenv("LOCAL_FOOD_TABLE")
+    LOCAL_FOOD_MIN_SCORE = float(os.getenv("LOCAL_FOOD_MIN_SCORE", 0.6))
+    # Gabungkan lookup yang bersamaan jadi satu query CalorieNinjas multi-item
+    NUTRITION_BATCHING_ENABLED = os.getenv("NUTRITION_BATCHING_ENABLED", "false").lower() == "true"
+    NUTRITION_BATCH_MAX_SIZE = int(os.getenv("NUTRITION_BATCH_MAX_SIZE", 10))
+    NUTRITION_BATCH_MAX_WAIT_MS = float(os.getenv("NUTRITION_BATCH_MAX_WAIT_MS", 20))
+    # POST /api/food/analyze/batch
+    FOOD_BATCH_MAX_ITEMS = int(os.getenv("FOOD_BATCH_MAX_ITEMS", 50))
+    FOOD_BATCH_WORKERS = int(os.getenv("FOOD_BATCH_WORKERS", 8))
+    DAILY_LOG_UPSERT_RETRIES = int(os.getenv("DAILY_LOG_UPSERT_RETRIES", 2))
+    # GET /api/food/history (limit default hanya dipakai jika client mengirim cursor tanpa limit)
+    HISTORY_DEFAULT_LIMIT = int(os.getenv("HISTORY_DEFAULT_LIMIT", 30))
+    HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", 366))
+    # GET /api/dashboard (profil + log hari ini diambil paralel)
+    DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", 8))
+    # Job async analyze-recipe (?async=1)
+    RECIPE_JOB_WORKERS = int(os.getenv("RECIPE_JOB_WORKERS", 2))
+    RECIPE_JOB_MAX_PENDING = int(os.getenv("RECIPE_JOB_MAX_PENDING", 20))
+    RECIPE_JOB_RESULT_TTL = int(os.getenv("RECIPE_JOB_RESULT_TTL", 600))
+    RECIPE_JOB_RETRY_AFTER = int(os.getenv("RECIPE_JOB_RETRY_AFTER", 5))
+    RECIPE_JOB_SPOOL_DIR = os.getenv("RECIPE_JOB_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "nutritrack_recipe_jobs"))
+    # Cache hasil OCR per hash gambar + preprocessing (Pillow) sebelum upload
+    RECIPE_IMAGE_CACHE_SIZE = int(os.getenv("RECIPE_IMAGE_CACHE_SIZE", 512))
+    RECIPE_IMAGE_CACHE_TTL = int(os.getenv("RECIPE_IMAGE_CACHE_TTL", 86400))
+    RECIPE_IMAGE_PREPROCESS = os.getenv("RECIPE_IMAGE_PREPROCESS", "true").lower() == "true"
+    RECIPE_IMAGE_MAX_SIDE = int(os.getenv("RECIPE_IMAGE_MAX_SIDE", 1600))
+    RECIPE_IMAGE_MIN_BYTES = int(os.getenv("RECIPE_IMAGE_MIN_BYTES", 200 * 1024))
+    RECIPE_IMAGE_MAX_PIXELS = int(os.getenv("RECIPE_IMAGE_MAX_PIXELS", 50_000_000))
+    RECIPE_IMAGE_JPEG_QUALITY = int(os.getenv("RECIPE_IMAGE_JPEG_QUALITY", 85))
+    ENSURE_INDEXES_ON_STARTUP = os.getenv("ENSURE_INDEXES_ON_STARTUP", "false").lower() == "true"
+
+    # Client HTTP keluar (CalorieNinjas, ESP32): pool, timeout, retry, circuit breaker
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 2))
+    HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.2))
+    HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", 2))
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+    HTTP_BREAKER_THRESHOLD = int(os.getenv("HTTP_BREAKER_THRESHOLD", 5))
+    HTTP_BREAKER_COOLDOWN = float(os.getenv("HTTP_BREAKER_COOLDOWN", 30))
+    CALORIE_NINJA_IMAGE_READ_TIMEOUT = float(os.getenv("CALORIE_NINJA_IMAGE_READ_TIMEOUT", 30))
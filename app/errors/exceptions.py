@@ -14,4 +14,10 @@ class NutritionAPIFetchError(Exception):
     pass
 
 class NoNutritionDataFound(Exception):
+    pass
+
+class ModelNotReadyError(Exception):
+    pass
+
+class QueueFullError(Exception):
     pass
\ No newline at end of file
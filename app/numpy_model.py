@@ -0,0 +1,43 @@
+import numpy as np
+
+class NumpyMLP:
+    """
+    Backend inference tanpa torch untuk CaloriesModel dan NutritionModel.
+    Menjalankan stack Linear + ReLU yang sama (ReLU di antara layer, tidak
+    di layer terakhir) dengan perkalian matriks NumPy.
+    """
+
+    def __init__(self, weights, biases):
+        # weights[i] berbentuk (in, out), sudah ditranspos dari nn.Linear
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        # Key berbentuk "fc.<index>.weight" / "fc.<index>.bias", urut sesuai index layer
+        layers = sorted({int(key.split('.')[1]) for key in state_dict if key.endswith('.weight')})
+        weights = [state_dict[f'fc.{i}.weight'].detach().cpu().numpy().T for i in layers]
+        biases = [state_dict[f'fc.{i}.bias'].detach().cpu().numpy() for i in layers]
+        return cls(weights, biases)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            count = len(data.files) // 2
+            return cls([data[f'w{i}'] for i in range(count)], [data[f'b{i}'] for i in range(count)])
+
+    def save(self, path):
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f'w{i}'] = w
+            arrays[f'b{i}'] = b
+        np.savez(path, **arrays)
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = x @ w + b
+            if i < last:
+                np.maximum(x, 0, out=x)
+        return x
@@ -1,12 +1,17 @@
-from flask import Blueprint, request, jsonify
-from app.services.dailyLogs_service import analyze_food,fetch_history_for_user,analyze_recipe
+from flask import Blueprint, Response, request, jsonify, current_app, url_for
+from app.services.dailyLogs_service import analyze_food,analyze_food_batch,fetch_history_for_user,analyze_recipe,analyze_recipe_content
+from app.services.recipe_job_service import recipe_jobs
 from app.errors.exceptions import (
     ValidationError, 
     NutritionAPIFetchError, 
-    NoNutritionDataFound
+    NoNutritionDataFound,
+    ServiceConnectionError,
+    QueueFullError
 )
+from app.config.Config import Config
+from app.services.rollup_service import get_rollup
 from bson.json_util import dumps
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 
 
 
@@ -42,18 +47,81 @@ def handle_analyze_food():
         return jsonify({"error": str(e)}), 404
     except NutritionAPIFetchError as e:
         return jsonify({"error": str(e)}), 502
+    except ServiceConnectionError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Terjadi kesalahan internal: {str(e)}"}), 500
 
+@food_bp.route('/analyze/batch', methods=['POST'])
+@jwt_required()
+def handle_analyze_food_batch():
+    try:
+        data = request.get_json()
+        user_id = get_jwt_identity()
+        items = data.get('items') if isinstance(data, dict) else data
+
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "items harus berupa list dan tidak boleh kosong"}), 400
+
+        result = analyze_food_batch(items, user_id)
+
+        # 207 jika sebagian item gagal, item yang berhasil tetap tersimpan
+        status = 200 if result["failed"] == 0 else 207
+        return jsonify(result), status
+
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Terjadi kesalahan internal: {str(e)}"}), 500
+
+def _stream_json_array(first, docs):
+    # Serialisasi per dokumen supaya seluruh riwayat tidak perlu dibangun di memori
+    yield "["
+    if first is not None:
+        yield dumps(first)
+        for doc in docs:
+            yield "," + dumps(doc)
+    yield "]"
+
 @food_bp.route('/history', methods=['GET'])
 @jwt_required()
 def get_history():
     try:
         user_id = get_jwt_identity()
-        logs = fetch_history_for_user(user_id)
-        
-        return dumps(logs), 200, {'Content-Type': 'application/json'}
+        logs, next_cursor = fetch_history_for_user(
+            user_id,
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit'),
+            fields=request.args.get('fields', 'full')
+        )
+
+        # Batch pertama (satu halaman penuh jika pakai limit/cursor) diambil sebelum Response
+        # dibuat, supaya error query masih dijawab 500, bukan 200 dengan JSON terpotong
+        docs = iter(logs)
+        first = next(docs, None)
+
+        headers = {'Content-Type': 'application/json'}
+        if next_cursor:
+            headers['X-Next-Cursor'] = next_cursor
+        return Response(_stream_json_array(first, docs), 200, headers)
+
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Terjadi kesalahan internal: {str(e)}"}), 500
+
+@food_bp.route('/rollups/<granularity>', methods=['GET'])
+@jwt_required()
+def get_rollups(granularity):
+    try:
+        user_id = get_jwt_identity()
+        result = get_rollup(user_id, granularity, request.args.get('period'), get_jwt())
+        return jsonify(result), 200
 
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Terjadi kesalahan internal: {str(e)}"}), 500
 
@@ -68,12 +136,46 @@ def get_recipe():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
+    if request.args.get('async') in ('1', 'true'):
+        return _submit_recipe_job(file)
+
     try:
     
         result = analyze_recipe(file)
         
         return jsonify(result), 200
 
+    except NutritionAPIFetchError as e:
+        return jsonify({"error": str(e)}), 502
     except Exception as e:
         # Handle Error Service
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+def _submit_recipe_job(file):
+    app = current_app._get_current_object()
+
+    def handler(filename, content, content_type):
+        # Worker berjalan di luar request, butuh app context untuk config
+        with app.app_context():
+            return analyze_recipe_content(filename, content, content_type)
+
+    try:
+        job_id = recipe_jobs.submit(file, get_jwt_identity(), handler)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429, {'Retry-After': str(Config.RECIPE_JOB_RETRY_AFTER)}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": url_for('food.get_recipe_job', job_id=job_id)
+    }), 202, {'Location': url_for('food.get_recipe_job', job_id=job_id)}
+
+@food_bp.route('/analyze-recipe/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_recipe_job(job_id):
+    job = recipe_jobs.get(job_id, get_jwt_identity())
+    if job is None:
+        return jsonify({"error": "Job tidak ditemukan atau sudah kedaluwarsa"}), 404
+    return jsonify(job), 200
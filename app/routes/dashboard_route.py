@@ -0,0 +1,20 @@
+from flask import Blueprint, jsonify
+from app.services.dashboard_service import get_dashboard
+from app.errors.exceptions import ValidationError
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+
+dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api')
+
+@dashboard_bp.route('/dashboard', methods=['GET'])
+@jwt_required()
+def dashboard():
+    try:
+        user_id = get_jwt_identity()
+        data = get_dashboard(user_id)
+        return jsonify(data), 200
+
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
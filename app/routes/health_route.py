@@ -0,0 +1,44 @@
+from flask import Blueprint, jsonify
+from app.routes.recomendation_route import diet_service
+from app.services.http_client import upstream_stats
+from app.services.nutrition_service import nutrition_stats
+from app.services.esp32_service import weight_poller
+from app.services.index_service import index_status
+from app.services.rollup_service import rollup_stats
+from app.services.recipe_job_service import recipe_jobs
+from app.services.recipe_image_service import recipe_image_stats, recipe_result_cache
+from app.extensions import mongo
+from app.config.Config import Config
+
+health_bp = Blueprint('health', __name__, url_prefix='/api/health')
+
+@health_bp.route('', methods=['GET'])
+def liveness():
+    return jsonify({"status": "ok"}), 200
+
+@health_bp.route('/ready', methods=['GET'])
+def readiness():
+    status = diet_service.status()
+    
+    if not status['ready']:
+        return jsonify({"status": "loading", "models": status}), 503, {'Retry-After': str(Config.MODEL_RETRY_AFTER)}
+
+    return jsonify({"status": "ready", "models": status}), 200
+
+@health_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        "upstreams": upstream_stats(),
+        "nutrition": nutrition_stats(),
+        "scale": weight_poller.stats() if weight_poller is not None else None,
+        "recipe_jobs": recipe_jobs.stats(),
+        "rollups": rollup_stats(),
+        "recipe_images": {**recipe_image_stats.as_dict(), "cache": recipe_result_cache.stats()}
+    }), 200
+
+
+@health_bp.route('/indexes', methods=['GET'])
+def indexes():
+    report = index_status(mongo.db)
+    healthy = all(entry['status'] == 'ok' for entry in report)
+    return jsonify({"status": "ok" if healthy else "degraded", "indexes": report}), 200
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app.services.recomendation_service import DietService
+from app.errors.exceptions import ValidationError, ModelNotReadyError
+from app.config.Config import Config
 
 recommendation_bp = Blueprint('recommendation_bp', __name__,url_prefix="/api")
 
@@ -24,8 +26,105 @@ def get_recommendation():
             'data': result
         }), 200
 
+    except ValidationError as e:
+        return jsonify({
+            'status': 'error', 
+            'message': str(e)
+        }), 400
+
+    except ModelNotReadyError as e:
+        return jsonify({
+            'status': 'error', 
+            'message': str(e)
+        }), 503, {'Retry-After': str(Config.MODEL_RETRY_AFTER)}
+
     except Exception as e:
         return jsonify({
             'status': 'error', 
             'message': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@recommendation_bp.route('/recommendation/batch', methods=['POST'])
+def get_recommendation_batch():
+    try:
+        data = request.get_json()
+        profiles = data.get('profiles') if isinstance(data, dict) else data
+
+        if not isinstance(profiles, list) or not profiles:
+            return jsonify({
+                'status': 'error', 
+                'message': 'profiles harus berupa list dan tidak boleh kosong'
+            }), 400
+
+        results = diet_service.process_recommendation_batch(profiles)
+
+        return jsonify({
+            'status': 'success',
+            'data': results
+        }), 200
+
+    except ValidationError as e:
+        return jsonify({
+            'status': 'error', 
+            'message': str(e)
+        }), 400
+
+    except ModelNotReadyError as e:
+        return jsonify({
+            'status': 'error', 
+            'message': str(e)
+        }), 503, {'Retry-After': str(Config.MODEL_RETRY_AFTER)}
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error', 
+            'message': str(e)
+        }), 500
+
+@recommendation_bp.route('/recommendation/replan', methods=['POST'])
+def replan_meal():
+    try:
+        data = request.get_json()
+
+        if not isinstance(data, dict):
+            return jsonify({
+                'status': 'error', 
+                'message': 'No input data provided'
+            }), 400
+
+        # Hanya pencarian resep untuk satu meal, target dipakai ulang
+        result = diet_service.replan_meal(data)
+
+        return jsonify({
+            'status': 'success',
+            'data': result
+        }), 200
+
+    except ValidationError as e:
+        return jsonify({
+            'status': 'error', 
+            'message': str(e)
+        }), 400
+
+    except ModelNotReadyError as e:
+        return jsonify({
+            'status': 'error', 
+            'message': str(e)
+        }), 503, {'Retry-After': str(Config.MODEL_RETRY_AFTER)}
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error', 
+            'message': str(e)
+        }), 500
+
+@recommendation_bp.route('/recommendation/stats', methods=['GET'])
+def get_recommendation_stats():
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'cache': diet_service.cache_stats(),
+            'plan_store': diet_service.plan_store.stats(),
+            'inference': diet_service.inference_stats()
+        }
+    }), 200
@@ -1,6 +1,8 @@
 from flask import Blueprint, jsonify,request
 from app.services.user_service import get_user_profile,update_user_profile
+from app.services.auth_service import create_user_token
 from app.errors.exceptions import ValidationError
+from app.config.Config import Config
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 
@@ -27,7 +29,11 @@ def update_profile():
     try:
         user_id = get_jwt_identity()
         data = request.get_json()
-        msg = update_user_profile(user_id, data)
-        return jsonify({"message": msg}), 200
+        msg, user = update_user_profile(user_id, data)
+        result = {"message": msg}
+        if user and Config.JWT_EMBED_PROFILE_CLAIMS:
+            # Token baru dengan claim target terbaru (token lama ditolak lewat profile version)
+            result["token"] = create_user_token(user)
+        return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,7 +1,15 @@
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError
 from app.extensions import mongo,bcrypt
 from app.errors.exceptions import ValidationError, DuplicateUserError,AuthError
 from flask_jwt_extended import create_access_token
+from app.services.user_service import profile_claims
+from app.config.Config import Config
+
+def create_user_token(user):
+    # Opsional: target + versi profil di token supaya endpoint panas bisa melewati MongoDB
+    claims = profile_claims(user) if Config.JWT_EMBED_PROFILE_CLAIMS else None
+    return create_access_token(identity=str(user['_id']), additional_claims=claims)
 
 def login_user(data):
     email = data.get('email')
@@ -11,7 +19,7 @@ def login_user(data):
     if not user or not bcrypt.check_password_hash(user['password'], password):
         raise AuthError("Email atau password salah")
 
-    token = create_access_token(identity=str(user['_id']))
+    token = create_user_token(user)
     
     return {
         "token": token,
@@ -27,6 +35,7 @@ def register_user(data):
     email = data['email']
     password = data['password']
 
+    # Cek cepat sebelum hashing; yang menjamin email unik tetap unique index users.email
     if mongo.db.users.find_one({"email": email}):
         raise DuplicateUserError("Email sudah terdaftar.")
 
@@ -51,6 +60,9 @@ def register_user(data):
         }
     }
 
-    result = mongo.db.users.insert_one(new_user_document)
+    try:
+        result = mongo.db.users.insert_one(new_user_document)
+    except DuplicateKeyError:
+        raise DuplicateUserError("Email sudah terdaftar.")
   
     return str(result.inserted_id)
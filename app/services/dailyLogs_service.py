@@ -1,117 +1,283 @@
+import copy
 import requests
 from app.errors.exceptions import (
   ValidationError,
-  NoNutritionDataFound,
-  NutritionAPIFetchError
+  NutritionAPIFetchError,
+  ServiceConnectionError
 )
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 from flask import current_app 
 from app.extensions import mongo
+from app.services.nutrition_service import normalize_food_name, resolve_nutrition_per_gram, scale_per_gram
+from app.services.http_client import calorie_ninjas_client
+from app.services.esp32_service import weight_poller
+from app.services.rollup_service import apply_rollups
+from app.services.recipe_image_service import (
+  content_hash,
+  preprocess_image,
+  recipe_result_cache,
+  recipe_image_stats
+)
+from app.config.Config import Config
 import random
 
-def analyze_food(food_name,food_name_display, meal_type,user_id):
-    esp32_url = current_app.config.get('ESP32_URL')
-    calorie_ninja_api_url = current_app.config.get('CALORIE_NINJA_API_URL')
-    calorie_ninja_api_key = current_app.config.get('CALORIE_NINJA_API_KEY')
-    
+def read_portion_weight():
+    """
+    Berat porsi (gram) dari bacaan stabil terakhir poller ESP32 (O(1), tanpa request ke device).
+    Jika ESP32 tidak dikonfigurasi, pakai berat random seperti sebelumnya.
+    """
+    if weight_poller is None:
+        # Data random
+        return random.randint(10, 100)
+
+    reading = weight_poller.latest(max_age=current_app.config.get('ESP32_MAX_READING_AGE'))
+    if reading is None:
+        raise ServiceConnectionError("Data berat dari timbangan belum tersedia atau sudah kedaluwarsa.")
+    return round(reading[0])
+
+VALID_MEAL_TYPES = ["Sarapan", "Makan Siang", "Makan Malam"]
+
+# Resolusi nutrisi untuk endpoint batch dijalankan paralel di pool ini
+food_batch_executor = ThreadPoolExecutor(
+    max_workers=Config.FOOD_BATCH_WORKERS,
+    thread_name_prefix="food-batch"
+)
+
+def _validate_food_item(food_name, meal_type):
     if not food_name:
         raise ValidationError("Nama makanan tidak boleh kosong.")
-        
-    VALID_MEAL_TYPES = ["Sarapan", "Makan Siang", "Makan Malam"]
+
+    if not isinstance(food_name, str):
+        raise ValidationError("Nama makanan harus berupa teks.")
+
     if meal_type not in VALID_MEAL_TYPES:
         raise ValidationError(f"mealType tidak valid. Harus salah satu dari: {VALID_MEAL_TYPES}")
 
+def _build_log_entry(food_name_display, food_item, weight_data):
+    return {
+        "foodName": food_name_display,
+        "timestamp": datetime.utcnow(),
+        "portionSize_g": weight_data,
+        "nutrition": {
+            "calories_kcal": round(food_item.get("calories", 0), 2),
+            "protein_g": round(food_item.get("protein_g", 0), 2),
+            "fat_total_g": round(food_item.get("fat_total_g", 0), 2),
+            "carbohydrates_g": round(food_item.get("carbohydrates_total_g", 0), 2)
+        }
+    }
+
+def _daily_log_update(user_id, entries_by_meal):
+    """
+    Query + update untuk dokumen daily_logs hari ini: satu $push ($each) per mealType
+    dan satu $inc untuk total summary dari semua entry.
+    """
+    user_id_obj = ObjectId(user_id)
+    today = datetime.combine(date.today(), datetime.min.time())
+
+    totals = {
+        "summary.total_calories_kcal": 0,
+        "summary.total_protein_g": 0,
+        "summary.total_fat_g": 0,
+        "summary.total_carbs_g": 0
+    }
+    for entries in entries_by_meal.values():
+        for entry in entries:
+            nutrition = entry["nutrition"]
+            totals["summary.total_calories_kcal"] += nutrition["calories_kcal"]
+            totals["summary.total_protein_g"] += nutrition["protein_g"]
+            totals["summary.total_fat_g"] += nutrition["fat_total_g"]
+            totals["summary.total_carbs_g"] += nutrition["carbohydrates_g"]
+
+    query = {"userId": user_id_obj, "tanggal": today}
+    update = {
+        "$push": {
+            f"log.{meal_type}": {"$each": entries}
+            for meal_type, entries in entries_by_meal.items()
+        },
+        "$inc": {key: round(value, 2) for key, value in totals.items()},
+        "$setOnInsert": {
+            "userId": user_id_obj,
+            "tanggal": today
+        }
+    }
+    return query, update
+
+def _is_duplicate_key(e):
+    if isinstance(e, DuplicateKeyError):
+        return True
+    errors = e.details.get("writeErrors", []) if isinstance(e, BulkWriteError) else []
+    return bool(errors) and all(error.get("code") == 11000 for error in errors)
+
+def _write_daily_log(query, update):
+    """
+    Upsert dokumen daily_logs hari ini dengan satu bulk_write. Dua upsert bersamaan
+    untuk dokumen yang belum ada bisa sama-sama mencoba insert; unique index
+    (userId, tanggal) menolak salah satunya dengan duplicate key, dan percobaan
+    ulang akan mengupdate dokumen yang sudah dibuat.
+    """
+    for attempt in range(Config.DAILY_LOG_UPSERT_RETRIES + 1):
+        try:
+            result = mongo.db.daily_logs.bulk_write([UpdateOne(query, update, upsert=True)])
+            break
+        except (DuplicateKeyError, BulkWriteError) as e:
+            if not _is_duplicate_key(e) or attempt == Config.DAILY_LOG_UPSERT_RETRIES:
+                raise
+
+    # Rollup mingguan/bulanan ikut di-$inc dengan nilai yang sama dengan summary harian
+    apply_rollups(query["userId"], query["tanggal"], update["$inc"])
+    return result
+
+def _map_request_error(e):
+    if isinstance(e, requests.exceptions.HTTPError):
+        return NutritionAPIFetchError(f"Terjadi masalah saat menghubungi CalorieNinjas API: {e.response.text}")
+    return NutritionAPIFetchError(f"Gagal terhubung ke CalorieNinjas: {e}")
+
+def analyze_food(food_name,food_name_display, meal_type,user_id):
+    calorie_ninja_api_url = current_app.config.get('CALORIE_NINJA_API_URL')
+    calorie_ninja_api_key = current_app.config.get('CALORIE_NINJA_API_KEY')
+    
+    _validate_food_item(food_name, meal_type)
+
     try:
         
-        # Data dari esp32
-        # response_esp = requests.get(esp32_url, timeout=15)
-        # response_esp.raise_for_status() 
-        # weight_data = round(float(response_esp.text.strip()))
-        
-        # Data random
-        weight_data = random.randint(10, 100)
+        # Data dari esp32 (bacaan terakhir dari background poller)
+        weight_data = read_portion_weight()
         
         # --- 2. Ambil Data Nutrisi ---
-        full_query = f"{weight_data}g {food_name}"
-        headers_ninja = {'X-Api-Key': calorie_ninja_api_key}
-        params_ninja = {'query': full_query}
-        response_ninja = requests.get(f"{calorie_ninja_api_url}/nutrition", headers=headers_ninja, params=params_ninja, timeout=10)
-        response_ninja.raise_for_status()
-        nutrition_data = response_ninja.json()
-
-        if not nutrition_data.get('items'):
-            raise NoNutritionDataFound(f"Tidak ditemukan data nutrisi untuk '{full_query}'")
-
-        food_item = nutrition_data['items'][0]
-
-       
-        user_id_obj = ObjectId(user_id) 
-        today = datetime.combine(date.today(), datetime.min.time())
-   
-
-        calories_to_add = round(food_item.get("calories", 0), 2)
-        protein_to_add = round(food_item.get("protein_g", 0), 2)
-        fat_to_add = round(food_item.get("fat_total_g", 0), 2)
-        carbs_to_add = round(food_item.get("carbohydrates_total_g", 0), 2) 
-        
-        new_entry = {
-            "foodName": food_name_display,
-            "timestamp": datetime.utcnow(),
-            "portionSize_g": weight_data,
-            "nutrition": {
-                "calories_kcal": calories_to_add,
-                "protein_g": protein_to_add,
-                "fat_total_g": fat_to_add,
-                "carbohydrates_g": carbs_to_add
-            }
-        }
+        # Nilai per gram di-cache per nama makanan, porsi dihitung lokal
+        per_gram, source = resolve_nutrition_per_gram(
+            food_name, food_name_display, calorie_ninja_api_url, calorie_ninja_api_key
+        )
+        food_item = scale_per_gram(per_gram, weight_data)
 
-        query = {"userId": user_id_obj, "tanggal": today}
-        
-        push_key = f"log.{meal_type}" 
-
-        update = {
-            "$push": { push_key: new_entry }, 
-            "$inc": {
-                "summary.total_calories_kcal": calories_to_add,
-                "summary.total_protein_g": protein_to_add,
-                "summary.total_fat_g": fat_to_add,
-                "summary.total_carbs_g": carbs_to_add
-            },
-         
-            "$setOnInsert": {
-                "userId": user_id_obj,
-                "tanggal": today
-            }
-        }
-        
-        mongo.db.daily_logs.update_one(query, update, upsert=True)
+        new_entry = _build_log_entry(food_name_display, food_item, weight_data)
+
+        query, update = _daily_log_update(user_id, {meal_type: [new_entry]})
+        _write_daily_log(query, update)
         
         return {
             "message": "Data nutrisi berhasil dianalisis dan disimpan.",
-            "query": full_query,
+            # Nama yang dikirim ke CalorieNinjas (tanpa berat); None jika dari tabel lokal
+            "query": normalize_food_name(food_name) if source == "calorieninjas" else None,
+            "source": source,
             "data": new_entry
         }
 
-    except requests.exceptions.HTTPError as http_err:
-        raise NutritionAPIFetchError(f"Terjadi masalah saat menghubungi CalorieNinjas API: {http_err.response.text}")
-    
     except requests.exceptions.RequestException as e:
-        raise NutritionAPIFetchError(f"Gagal terhubung ke CalorieNinjas: {e}")
+        raise _map_request_error(e)
+
+def _resolve_food_item(item, api_url, api_key):
+    """Validasi + lookup nutrisi satu item batch (tanpa menulis ke DB)."""
+    if not isinstance(item, dict):
+        raise ValidationError("Setiap item harus berupa object JSON")
+
+    food_name = item.get('foodName')
+    meal_type = item.get('mealType')
+    _validate_food_item(food_name, meal_type)
+
+    weight_data = item.get('portionSize_g')
+    if weight_data is None:
+        weight_data = read_portion_weight()
+    elif isinstance(weight_data, bool) or not isinstance(weight_data, (int, float)) or weight_data <= 0:
+        raise ValidationError("portionSize_g harus berupa angka positif")
+
+    food_name_display = item.get('foodNameDisplay') or food_name
+    if not isinstance(food_name_display, str):
+        raise ValidationError("foodNameDisplay harus berupa teks")
+    try:
+        per_gram, source = resolve_nutrition_per_gram(food_name, food_name_display, api_url, api_key)
+    except requests.exceptions.RequestException as e:
+        raise _map_request_error(e)
+
+    food_item = scale_per_gram(per_gram, weight_data)
+    return meal_type, source, _build_log_entry(food_name_display, food_item, weight_data)
+
+def analyze_food_batch(items, user_id):
+    """
+    Log banyak makanan sekaligus (misal satu porsi makan lengkap).
+    Nutrisi semua item di-resolve paralel, lalu item yang berhasil ditulis
+    dengan satu bulk_write ke dokumen daily_logs hari ini. Item yang gagal
+    dilaporkan per index tanpa membatalkan item lain.
+    """
+    if len(items) > Config.FOOD_BATCH_MAX_ITEMS:
+        raise ValidationError(f"Maksimal {Config.FOOD_BATCH_MAX_ITEMS} makanan per batch")
+
+    calorie_ninja_api_url = current_app.config.get('CALORIE_NINJA_API_URL')
+    calorie_ninja_api_key = current_app.config.get('CALORIE_NINJA_API_KEY')
+
+    app = current_app._get_current_object()
+
+    def resolve(item):
+        # read_portion_weight butuh current_app di thread worker
+        with app.app_context():
+            return _resolve_food_item(item, calorie_ninja_api_url, calorie_ninja_api_key)
+
+    futures = [food_batch_executor.submit(resolve, item) for item in items]
+
+    results = [None] * len(items)
+    entries_by_meal = {}
+    for i, future in enumerate(futures):
+        try:
+            meal_type, source, entry = future.result()
+        except Exception as e:
+            # Error apa pun di satu item (termasuk yang tidak terduga) hanya menggagalkan item itu
+            results[i] = {"index": i, "status": "error", "error": type(e).__name__, "message": str(e)}
+            continue
+        entries_by_meal.setdefault(meal_type, []).append(entry)
+        results[i] = {"index": i, "status": "success", "mealType": meal_type, "source": source, "data": entry}
+
+    saved = sum(len(entries) for entries in entries_by_meal.values())
+    if saved:
+        query, update = _daily_log_update(user_id, entries_by_meal)
+        _write_daily_log(query, update)
+
+    return {
+        "message": f"{saved} dari {len(items)} makanan berhasil dianalisis dan disimpan.",
+        "saved": saved,
+        "failed": len(items) - saved,
+        "items": results
+    }
 
 def analyze_recipe(image_file):
+    return analyze_recipe_content(image_file.filename, image_file.read(), image_file.content_type)
+
+def analyze_recipe_content(filename, content, content_type):
+    """
+    OCR resep lewat CalorieNinjas. Dipakai request sinkron dan worker job async.
+    Hasil di-cache per sha256 isi gambar asli; gambar besar diperkecil sebelum dikirim.
+    """
     try:
+        cache_key = content_hash(content)
+        cached_items = recipe_result_cache.get(cache_key)
+        if cached_items is not None:
+            recipe_image_stats.add(hits=1)
+            return {"items": copy.deepcopy(cached_items)}
+        recipe_image_stats.add(misses=1)
+
+        original_size = len(content)
+        content, filename, content_type = preprocess_image(content, filename, content_type)
+        recipe_image_stats.add(bytes_in=original_size, bytes_sent=len(content))
+
         calorie_ninja_api_url = current_app.config.get('CALORIE_NINJA_API_URL')
         calorie_ninja_api_key = current_app.config.get('CALORIE_NINJA_API_KEY')
-        files = {'image': (image_file.filename, image_file.read(), image_file.content_type)}
+        # bytes (bukan stream) supaya retry di UpstreamClient mengirim ulang isi yang sama
+        files = {'image': (filename, content, content_type)}
         headers = {'X-Api-Key': calorie_ninja_api_key}
 
-        # 2. Request ke External API
-        response = requests.post(f"{calorie_ninja_api_url}/imagetextnutrition", headers=headers, files=files)
+        # 2. Request ke External API (OCR butuh read timeout lebih panjang)
+        response = calorie_ninjas_client.post(
+            f"{calorie_ninja_api_url}/imagetextnutrition",
+            headers=headers,
+            files=files,
+            timeout=(current_app.config.get('HTTP_CONNECT_TIMEOUT'), current_app.config.get('CALORIE_NINJA_IMAGE_READ_TIMEOUT'))
+        )
 
         if response.status_code != 200:
-            raise Exception(f"CalorieNinjas Error: {response.text}")
+            raise NutritionAPIFetchError(f"CalorieNinjas Error: {response.text}")
 
         data = response.json()
         items = data.get('items', [])
@@ -136,18 +302,73 @@ def analyze_recipe(image_file):
             }
             processed_items.append(current_item)
 
+        recipe_result_cache.set(cache_key, copy.deepcopy(processed_items))
         return {"items": processed_items}
 
     except Exception as e:
         print(f"Service Error: {str(e)}")
         raise e
 
-def fetch_history_for_user(user_id):
-    user_id_obj = ObjectId(user_id) 
+HISTORY_FIELDS = {
+    "full": None,
+    # Tanpa array log per meal, hanya tanggal + summary
+    "summary": {"log": 0}
+}
+
+def _parse_history_date(value, name):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise ValidationError(f"{name} harus berformat YYYY-MM-DD")
+
+def fetch_history_for_user(user_id, date_from=None, date_to=None, cursor=None, limit=None, fields="full"):
+    """
+    Riwayat daily_logs user, terbaru dulu, dengan keyset pagination di tanggal.
+    Mengembalikan (cursor MongoDB, next_cursor). next_cursor adalah tanggal
+    (YYYY-MM-DD) item terakhir di halaman ini, atau None jika sudah halaman terakhir;
+    kirim kembali sebagai `cursor` untuk halaman berikutnya.
+
+    Pagination hanya aktif jika `limit` atau `cursor` dikirim; tanpa keduanya seluruh
+    riwayat (sesuai filter tanggal) dikembalikan seperti sebelumnya.
+    """
+    if fields not in HISTORY_FIELDS:
+        raise ValidationError(f"fields tidak valid. Harus salah satu dari: {list(HISTORY_FIELDS)}")
+
+    paginated = limit is not None or bool(cursor)
+    if paginated:
+        if limit is None:
+            limit = Config.HISTORY_DEFAULT_LIMIT
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ValidationError("limit harus berupa angka")
+        if limit < 1 or limit > Config.HISTORY_MAX_LIMIT:
+            raise ValidationError(f"limit harus antara 1 dan {Config.HISTORY_MAX_LIMIT}")
+
+    tanggal = {}
+    if date_from:
+        tanggal["$gte"] = _parse_history_date(date_from, "from")
+    if date_to:
+        tanggal["$lte"] = _parse_history_date(date_to, "to")
+    if cursor:
+        tanggal["$lt"] = _parse_history_date(cursor, "cursor")
+
+    query = {"userId": ObjectId(user_id)}
+    if tanggal:
+        query["tanggal"] = tanggal
+
+    logs = mongo.db.daily_logs.find(query, HISTORY_FIELDS[fields]).sort("tanggal", -1)
+    if not paginated:
+        return logs, None
 
-    cursor = mongo.db.daily_logs.find(
-        {"userId": user_id_obj}
-    ).sort("tanggal", -1)
+    # Cek item terakhir halaman ini + apakah masih ada halaman berikutnya (hanya field tanggal)
+    boundary = list(
+        mongo.db.daily_logs.find(query, {"_id": 0, "tanggal": 1})
+        .sort("tanggal", -1)
+        .skip(limit - 1)
+        .limit(2)
+    )
+    next_cursor = boundary[0]["tanggal"].strftime("%Y-%m-%d") if len(boundary) == 2 else None
 
-    logs = list(cursor)
-    return logs
\ No newline at end of file
+    # Satu halaman = satu batch, jadi seluruh halaman sudah terbaca saat dokumen pertama diambil
+    return logs.limit(limit).batch_size(limit), next_cursor
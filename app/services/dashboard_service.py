@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from bson.objectid import ObjectId
+from app.extensions import mongo
+from app.services.user_service import get_user_profile
+from app.services.rollup_service import SUMMARY_FIELDS, TARGET_FIELDS
+from app.config.Config import Config
+
+# Profil (biasanya dari profile_cache) dimuat di pool ini selagi log hari ini diambil
+dashboard_executor = ThreadPoolExecutor(
+    max_workers=Config.DASHBOARD_WORKERS,
+    thread_name_prefix="dashboard"
+)
+
+
+def _today_summary(user_id, today):
+    # Hanya summary; array log per meal tidak ikut dikirim dari MongoDB
+    doc = mongo.db.daily_logs.find_one(
+        {"userId": ObjectId(user_id), "tanggal": today},
+        {"_id": 0, "summary": 1}
+    ) or {}
+    summary = doc.get("summary", {})
+    return {field: round(summary.get(field, 0), 2) for field in SUMMARY_FIELDS}
+
+
+def get_dashboard(user_id):
+    """
+    Data layar utama dalam satu request: profil + target, total hari ini, sisa dan
+    progres (%) per target. Profil dan dokumen daily_logs hari ini diambil paralel.
+    """
+    today = datetime.combine(date.today(), datetime.min.time())
+
+    profile_future = dashboard_executor.submit(get_user_profile, user_id)
+    consumed = _today_summary(user_id, today)
+    profile = profile_future.result()
+
+    targets = profile.pop("targets")
+    remaining = {}
+    progress = {}
+    for field in SUMMARY_FIELDS:
+        target_key = TARGET_FIELDS[field]
+        target = targets.get(target_key)
+        remaining[target_key] = round(target - consumed[field], 2) if target is not None else None
+        progress[target_key] = round(consumed[field] / target * 100, 1) if target else None
+
+    return {
+        "tanggal": today.strftime("%Y-%m-%d"),
+        "profile": profile,
+        "targets": targets,
+        "today": consumed,
+        "remaining_calories": remaining["calories"],
+        "remaining": remaining,
+        "progress": progress
+    }
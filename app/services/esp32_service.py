@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+from app.services.http_client import esp32_client
+from app.config.Config import Config
+
+
+class StubScale:
+    """Pengganti ESP32 untuk development/test: mengembalikan berat yang di-set manual."""
+
+    def __init__(self, weight=0.0):
+        self.weight = float(weight)
+
+    def set_weight(self, weight):
+        self.weight = float(weight)
+
+    def __call__(self):
+        return self.weight
+
+
+def http_weight_source(url, timeout):
+    def fetch():
+        response = esp32_client.get(url, timeout=timeout)
+        response.raise_for_status()
+        return float(response.text.strip())
+    return fetch
+
+
+class WeightPoller:
+    """
+    Polling timbangan di background thread dan simpan bacaan stabil terakhir.
+    Bacaan dianggap stabil jika `stable_readings` bacaan berturut-turut
+    selisihnya (max - min) tidak lebih dari `stable_delta` gram.
+    """
+
+    def __init__(self, source, interval, stable_readings, stable_delta):
+        self.source = source
+        self.interval = interval
+        self.stable_delta = stable_delta
+        self._window = deque(maxlen=stable_readings)
+        self._latest = None  # (berat, timestamp time.time())
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.polls = 0
+        self.errors = 0
+        self.unstable = 0
+        self.last_error = None
+        self.last_raw = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="esp32-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll_once()
+            self._stop.wait(self.interval)
+
+    def poll_once(self):
+        self.polls += 1
+        try:
+            value = float(self.source())
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            return
+
+        self.last_raw = value
+        self._window.append(value)
+        if len(self._window) < self._window.maxlen or max(self._window) - min(self._window) > self.stable_delta:
+            self.unstable += 1
+            return
+
+        stable = sum(self._window) / len(self._window)
+        with self._lock:
+            self._latest = (stable, time.time())
+
+    def latest(self, max_age=None):
+        """Bacaan stabil terakhir (berat, timestamp), atau None jika belum ada / terlalu lama."""
+        with self._lock:
+            latest = self._latest
+        if latest is None:
+            return None
+        if max_age is not None and time.time() - latest[1] > max_age:
+            return None
+        return latest
+
+    def stats(self):
+        latest = self.latest()
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "interval_s": self.interval,
+            "polls": self.polls,
+            "errors": self.errors,
+            "unstable": self.unstable,
+            "last_error": self.last_error,
+            "last_raw": self.last_raw,
+            "latest_weight_g": latest[0] if latest else None,
+            "latest_age_s": round(time.time() - latest[1], 3) if latest else None
+        }
+
+
+def _build_poller():
+    if Config.ESP32_STUB_WEIGHT is not None:
+        source = StubScale(Config.ESP32_STUB_WEIGHT)
+    elif Config.ESP32_URL:
+        source = http_weight_source(Config.ESP32_URL, (Config.HTTP_CONNECT_TIMEOUT, Config.ESP32_READ_TIMEOUT))
+    else:
+        return None
+    return WeightPoller(
+        source,
+        interval=Config.ESP32_POLL_INTERVAL,
+        stable_readings=Config.ESP32_STABLE_READINGS,
+        stable_delta=Config.ESP32_STABLE_DELTA
+    )
+
+
+# None jika ESP32 tidak dikonfigurasi (analyze_food memakai berat random seperti sebelumnya)
+weight_poller = _build_poller()
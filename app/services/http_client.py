@@ -0,0 +1,186 @@
+import random
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from app.errors.exceptions import NutritionAPIFetchError, ServiceConnectionError
+from app.config.Config import Config
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class UpstreamClient:
+    """
+    Client HTTP bersama untuk satu upstream (CalorieNinjas, ESP32, ...).
+    - Session dengan connection pool keep-alive per host
+    - Timeout connect/read eksplisit
+    - Retry terbatas dengan jittered exponential backoff untuk 429/5xx dan error koneksi
+    - Circuit breaker: setelah beberapa kegagalan berturut-turut, request langsung
+      gagal dengan error_class sampai cooldown selesai
+    """
+
+    def __init__(self, name, error_class, connect_timeout, read_timeout, max_retries,
+                 backoff_base, backoff_max, pool_size, breaker_threshold, breaker_cooldown):
+        self.name = name
+        self.error_class = error_class
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._latencies = deque(maxlen=1024)
+        self.counters = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "success": 0,
+            "http_4xx": 0,
+            "http_429": 0,
+            "http_5xx": 0,
+            "timeouts": 0,
+            "connection_errors": 0,
+            "short_circuited": 0,
+            "breaker_opened": 0
+        }
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = self.backoff_base * (2 ** attempt)
+        # Full jitter, dibatasi backoff_max supaya worker tidak tertahan lama
+        time.sleep(random.uniform(0, min(delay, self.backoff_max)))
+
+    def _check_breaker(self):
+        with self._lock:
+            if self._open_until > time.monotonic():
+                self.counters["short_circuited"] += 1
+                raise self.error_class(f"{self.name} sedang tidak tersedia, coba lagi nanti.")
+
+    def _record_result(self, failed):
+        with self._lock:
+            if not failed:
+                self._consecutive_failures = 0
+                return
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self.breaker_threshold:
+                # Setelah cooldown request berikutnya jadi percobaan (half-open);
+                # jika gagal lagi breaker langsung terbuka kembali
+                self._open_until = time.monotonic() + self.breaker_cooldown
+                self._consecutive_failures = self.breaker_threshold - 1
+                self.counters["breaker_opened"] += 1
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self._check_breaker()
+        self._count("requests")
+
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            if attempt:
+                self._count("retries")
+            self._count("attempts")
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except requests.exceptions.Timeout:
+                self._count("timeouts")
+                if last:
+                    self._record_result(failed=True)
+                    raise
+                self._backoff(attempt)
+                continue
+            except requests.exceptions.ConnectionError:
+                self._count("connection_errors")
+                if last:
+                    self._record_result(failed=True)
+                    raise
+                self._backoff(attempt)
+                continue
+
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+
+            status = response.status_code
+            if status in RETRY_STATUS:
+                self._count("http_429" if status == 429 else "http_5xx")
+                if not last:
+                    self._backoff(attempt, response)
+                    continue
+                self._record_result(failed=True)
+                return response
+
+            self._count("http_4xx" if status >= 400 else "success")
+            self._record_result(failed=False)
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self.counters)
+            breaker_open = self._open_until > time.monotonic()
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            "breaker": "open" if breaker_open else "closed",
+            "counters": counters,
+            "latency_ms": {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0
+            }
+        }
+
+
+def _build_client(name, error_class):
+    return UpstreamClient(
+        name,
+        error_class,
+        connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+        read_timeout=Config.HTTP_READ_TIMEOUT,
+        max_retries=Config.HTTP_MAX_RETRIES,
+        backoff_base=Config.HTTP_BACKOFF_BASE,
+        backoff_max=Config.HTTP_BACKOFF_MAX,
+        pool_size=Config.HTTP_POOL_SIZE,
+        breaker_threshold=Config.HTTP_BREAKER_THRESHOLD,
+        breaker_cooldown=Config.HTTP_BREAKER_COOLDOWN
+    )
+
+
+calorie_ninjas_client = _build_client("CalorieNinjas", NutritionAPIFetchError)
+esp32_client = _build_client("ESP32", ServiceConnectionError)
+
+upstream_clients = {
+    "calorieninjas": calorie_ninjas_client,
+    "esp32": esp32_client
+}
+
+
+def upstream_stats():
+    return {name: client.stats() for name, client in upstream_clients.items()}
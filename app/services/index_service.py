@@ -0,0 +1,82 @@
+from pymongo.errors import PyMongoError
+
+# Index yang dibutuhkan query aplikasi, per koleksi
+#   daily_logs: analyze_food ({userId, tanggal}) + history (userId, sort tanggal);
+#               unique supaya upsert bersamaan di hari yang sama tidak membuat dua dokumen
+#   users: login_user / register_user by email; unique menggantikan cek find-then-insert
+#   nutrition_cache: TTL di expires_at (lihat NutritionCache)
+#   recipe_jobs: TTL di expires_at (status & hasil job analyze-recipe async)
+#   recommendation_plans: TTL di expires_at (target per plan_id untuk replan, lihat PlanStore)
+INDEXES = {
+    "daily_logs": [
+        {"keys": [("userId", 1), ("tanggal", -1)], "name": "userId_tanggal_unique", "unique": True}
+    ],
+    "users": [
+        {"keys": [("email", 1)], "name": "email_unique", "unique": True}
+    ],
+    "nutrition_cache": [
+        {"keys": [("expires_at", 1)], "name": "expires_at_1", "expireAfterSeconds": 0}
+    ],
+    "recipe_jobs": [
+        {"keys": [("expires_at", 1)], "name": "expires_at_1", "expireAfterSeconds": 0}
+    ],
+    "recommendation_plans": [
+        {"keys": [("expires_at", 1)], "name": "expires_at_1", "expireAfterSeconds": 0}
+    ]
+}
+
+INDEX_OPTIONS = ["unique", "expireAfterSeconds"]
+
+
+def _options(spec):
+    return {option: spec[option] for option in INDEX_OPTIONS if option in spec}
+
+
+def _compare(spec, existing):
+    """Status satu index dibanding index_information() koleksi."""
+    info = existing.get(spec["name"])
+    if info is None:
+        same_keys = [name for name, idx in existing.items() if list(idx["key"]) == spec["keys"]]
+        if same_keys:
+            return "conflict", f"key yang sama sudah ada dengan nama {same_keys[0]}"
+        return "missing", None
+
+    actual = {option: info[option] for option in INDEX_OPTIONS if option in info}
+    if list(info["key"]) != spec["keys"] or actual != _options(spec):
+        return "conflict", f"definisi berbeda: {info}"
+    return "ok", None
+
+
+def index_status(db):
+    report = []
+    for collection, specs in INDEXES.items():
+        try:
+            existing = db[collection].index_information()
+        except PyMongoError as e:
+            existing = {}
+            print(f"index_information {collection} error: {e}")
+        for spec in specs:
+            status, detail = _compare(spec, existing)
+            report.append({"collection": collection, "name": spec["name"], "status": status, "detail": detail})
+    return report
+
+
+def ensure_indexes(db):
+    """
+    Buat index yang belum ada. Idempotent: index yang sudah sesuai dilewati,
+    index dengan definisi berbeda tidak di-drop, hanya dilaporkan sebagai conflict.
+    Membuat unique index gagal jika data lama sudah duplikat; error dilaporkan per index.
+    """
+    report = []
+    for entry in index_status(db):
+        if entry["status"] == "missing":
+            spec = next(s for s in INDEXES[entry["collection"]] if s["name"] == entry["name"])
+            try:
+                db[entry["collection"]].create_index(spec["keys"], name=spec["name"], **_options(spec))
+                entry["status"] = "created"
+            except PyMongoError as e:
+                entry["status"] = "error"
+                entry["detail"] = str(e)
+        report.append(entry)
+
+    return report
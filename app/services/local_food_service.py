@@ -0,0 +1,138 @@
+import csv
+import os
+import re
+import threading
+from collections import Counter
+import numpy as np
+from app.config.Config import Config
+
+# Tabel komposisi makanan lokal (per 100 g), kolom nama + alias (dipisah "|"),
+# kolom lain numerik dengan nama yang sama seperti field CalorieNinjas.
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'artifacts', 'food_composition.csv')
+
+
+def normalize_name(name):
+    return re.sub(r"[^0-9a-z]+", " ", name.lower()).strip()
+
+
+def trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class LocalFoodDB:
+    """
+    Lookup nutrisi tanpa jaringan. Nilai disimpan sebagai matrix float32 per gram
+    (baris = makanan, kolom = field nutrisi). Nama Indonesia/Inggris dan alias
+    dicocokkan lewat exact match, lalu trigram index (skor Dice) untuk typo/variasi.
+    """
+
+    def __init__(self, path, min_score):
+        self.path = path
+        self.min_score = min_score
+
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+
+        self.fields = [col for col in rows[0].keys() if col not in ('name', 'aliases')] if rows else []
+        self.names = [row['name'] for row in rows]
+        self.per_gram = np.array(
+            [[float(row[field] or 0) / 100 for field in self.fields] for row in rows],
+            dtype=np.float32
+        ).reshape(len(rows), len(self.fields))
+
+        # Alias -> index makanan; trigram -> index alias
+        self.aliases = []
+        self.alias_food = []
+        self.alias_trigram_count = []
+        self.exact = {}
+        self.trigram_index = {}
+        for food_id, row in enumerate(rows):
+            for alias in [row['name']] + row['aliases'].split('|'):
+                key = normalize_name(alias)
+                if not key or key in self.exact:
+                    continue
+                alias_id = len(self.aliases)
+                grams = trigrams(key)
+                self.aliases.append(key)
+                self.alias_food.append(food_id)
+                self.alias_trigram_count.append(len(grams))
+                self.exact[key] = food_id
+                for gram in grams:
+                    self.trigram_index.setdefault(gram, []).append(alias_id)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def _count(self, key):
+        with self._lock:
+            setattr(self, key, getattr(self, key) + 1)
+
+    def match(self, name):
+        """(food_id, alias, skor) terbaik untuk nama, atau None jika di bawah min_score."""
+        key = normalize_name(name or "")
+        if not key:
+            return None
+        if key in self.exact:
+            return self.exact[key], key, 1.0
+
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.trigram_index.get(gram, ()))
+        if not shared:
+            return None
+
+        best_alias, best_score = None, 0.0
+        for alias_id, common in shared.items():
+            score = 2 * common / (len(grams) + self.alias_trigram_count[alias_id])
+            if score > best_score:
+                best_alias, best_score = alias_id, score
+
+        if best_score < self.min_score:
+            return None
+        return self.alias_food[best_alias], self.aliases[best_alias], round(best_score, 3)
+
+    def lookup(self, *names):
+        """
+        Nilai per gram untuk kandidat nama pertama yang cocok (mis. foodName lalu
+        foodNameDisplay). Mengembalikan (per_gram dict, info match) atau None.
+        """
+        best = None
+        for name in names:
+            found = self.match(name)
+            if found and (best is None or found[2] > best[0][2]):
+                best = (found, name)
+            if found and found[2] == 1.0:
+                break
+
+        if best is None:
+            self._count("misses")
+            return None
+
+        (food_id, alias, score), query = best
+        self._count("hits" if score == 1.0 else "fuzzy_hits")
+        per_gram = dict(zip(self.fields, self.per_gram[food_id].tolist()))
+        return per_gram, {"food": self.names[food_id], "matched_alias": alias, "query": query, "score": score}
+
+    def stats(self):
+        return {
+            "foods": len(self.names),
+            "aliases": len(self.aliases),
+            "exact_hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses
+        }
+
+
+def _load_local_db():
+    path = Config.LOCAL_FOOD_TABLE or DEFAULT_TABLE_PATH
+    if not os.path.exists(path):
+        print(f"Tabel makanan lokal tidak ditemukan: {path}")
+        return None
+    return LocalFoodDB(path, min_score=Config.LOCAL_FOOD_MIN_SCORE)
+
+
+local_food_db = _load_local_db()
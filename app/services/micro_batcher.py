@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Kumpulkan item dari banyak thread/request dalam jendela waktu singkat
+    (max_wait detik atau max_batch item), lalu proses sekaligus dengan satu
+    panggilan handler(list_item) -> list_hasil (urutan sama dengan input).
+    """
+
+    def __init__(self, name, handler, max_batch=32, max_wait=0.002, history=1024):
+        self.name = name
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.batch_size_histogram = {}
+        self._waits = deque(maxlen=history)
+
+    def _ensure_worker(self):
+        # Thread dibuat saat pertama dipakai (aman untuk worker yang di-fork)
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                self._worker.start()
+
+    def submit(self, item):
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items):
+        """Masukkan beberapa item dan tunggu hasilnya (blocking)."""
+        self._ensure_worker()
+        futures = []
+        now = time.monotonic()
+        for item in items:
+            future = Future()
+            self._queue.put((item, future, now))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        started = time.monotonic()
+        items = [item for item, _, _ in batch]
+        try:
+            results = self.handler(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Batcher {self.name}: handler mengembalikan {len(results)} hasil untuk {len(items)} item")
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            failed = False
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            failed = True
+
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.errors += int(failed)
+            self.batch_size_histogram[len(batch)] = self.batch_size_histogram.get(len(batch), 0) + 1
+            self._waits.extend(started - enqueued for _, _, enqueued in batch)
+
+    def stats(self):
+        with self._stats_lock:
+            waits = sorted(self._waits)
+            histogram = dict(sorted(self.batch_size_histogram.items()))
+            batches, items, errors = self.batches, self.items, self.errors
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 3)
+
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "items": items,
+            "errors": errors,
+            "avg_batch_size": round(items / batches, 2) if batches else 0.0,
+            "batch_size_histogram": histogram,
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 3) if waits else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(waits[-1] * 1000, 3) if waits else 0.0
+            }
+        }
@@ -0,0 +1,339 @@
+import re
+import threading
+import requests
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from pymongo.errors import PyMongoError
+from app.extensions import mongo
+from app.services.cache import LRUCache
+from app.services.http_client import calorie_ninjas_client
+from app.services.micro_batcher import MicroBatcher
+from app.services.local_food_service import local_food_db
+from app.errors.exceptions import NoNutritionDataFound, NutritionAPIFetchError, ValidationError
+from app.config.Config import Config
+
+# Field numerik dari item CalorieNinjas yang disimpan per gram
+NUTRIENT_FIELDS = [
+    "calories",
+    "protein_g",
+    "fat_total_g",
+    "fat_saturated_g",
+    "carbohydrates_total_g",
+    "fiber_g",
+    "sugar_g",
+    "sodium_mg",
+    "potassium_mg",
+    "cholesterol_mg"
+]
+
+
+def normalize_food_name(food_name):
+    return re.sub(r"\s+", " ", food_name.strip().lower())
+
+
+def per_gram_from_item(item):
+    """Ubah satu item CalorieNinjas (per serving_size_g) menjadi nilai per gram."""
+    serving = float(item.get("serving_size_g") or 0)
+    if serving <= 0:
+        return None
+    return {field: float(item.get(field) or 0) / serving for field in NUTRIENT_FIELDS}
+
+
+def scale_per_gram(per_gram, weight_g):
+    return {field: value * weight_g for field, value in per_gram.items()}
+
+
+def _query_items(query, api_url, api_key):
+    response = calorie_ninjas_client.get(
+        f"{api_url}/nutrition",
+        headers={'X-Api-Key': api_key},
+        params={'query': query}
+    )
+    response.raise_for_status()
+    return response.json().get('items') or []
+
+
+def fetch_per_gram(food_name, api_url, api_key):
+    """Query CalorieNinjas tanpa berat, lalu normalisasi ke per gram."""
+    items = _query_items(food_name, api_url, api_key)
+
+    per_gram = per_gram_from_item(items[0]) if items else None
+    if per_gram is None:
+        raise NoNutritionDataFound(f"Tidak ditemukan data nutrisi untuk '{food_name}'")
+    return per_gram
+
+
+class CombinedQueryStats:
+    def __init__(self):
+        self.combined_queries = 0
+        self.combined_items = 0
+        self.combined_failures = 0
+        self.fallback_items = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+combined_query_stats = CombinedQueryStats()
+
+
+def _can_combine(food_name):
+    # Nama yang mengandung pemisah query tidak bisa dipisah lagi dengan aman
+    return " and " not in f" {food_name} " and "," not in food_name
+
+
+def fetch_many_per_gram(requests_batch):
+    """
+    Handler MicroBatcher: requests_batch berisi tuple (nama, api_url, api_key).
+    Nama yang bisa digabung dikirim sebagai satu query "a and b and c"; item hasil
+    dipasangkan kembali lewat field name. Nama yang tidak cocok tepat satu item, atau semua
+    nama jika query gabungan gagal, di-query ulang satu per satu. Hasil per item berupa
+    dict per gram atau exception, jadi kegagalan satu nama tidak ikut menggagalkan nama lain.
+    """
+    results = [None] * len(requests_batch)
+    groups = {}
+    for i, (food_name, api_url, api_key) in enumerate(requests_batch):
+        groups.setdefault((api_url, api_key), {}).setdefault(food_name, []).append(i)
+
+    for (api_url, api_key), by_name in groups.items():
+        combinable = [name for name in by_name if _can_combine(name)]
+        pending = [name for name in by_name if name not in combinable]
+
+        items = None
+        if len(combinable) > 1:
+            try:
+                items = _query_items(" and ".join(combinable), api_url, api_key)
+                combined_query_stats.combined_queries += 1
+            except Exception as e:
+                combined_query_stats.combined_failures += 1
+                print(f"Query gabungan CalorieNinjas gagal, fallback per nama: {e}")
+
+        if items is not None:
+            matches = {}
+            for item in items:
+                matches.setdefault(normalize_food_name(str(item.get('name', ''))), []).append(item)
+
+            for name in combinable:
+                found = matches.get(name, [])
+                per_gram = per_gram_from_item(found[0]) if len(found) == 1 else None
+                if per_gram is None:
+                    pending.append(name)
+                    continue
+                combined_query_stats.combined_items += 1
+                for i in by_name[name]:
+                    results[i] = per_gram
+        else:
+            pending.extend(combinable)
+
+        for name in pending:
+            if len(combinable) > 1 and name in combinable:
+                combined_query_stats.fallback_items += 1
+            try:
+                per_gram = fetch_per_gram(name, api_url, api_key)
+            except Exception as e:
+                per_gram = e
+            for i in by_name[name]:
+                results[i] = per_gram
+
+    return results
+
+
+# Lookup dari request yang bersamaan digabung jadi satu query multi-item (opsional)
+nutrition_batcher = None
+if Config.NUTRITION_BATCHING_ENABLED:
+    nutrition_batcher = MicroBatcher(
+        'calorieninjas',
+        fetch_many_per_gram,
+        max_batch=Config.NUTRITION_BATCH_MAX_SIZE,
+        max_wait=Config.NUTRITION_BATCH_MAX_WAIT_MS / 1000
+    )
+
+
+def fetch_per_gram_batched(food_name, api_url, api_key):
+    if nutrition_batcher is None:
+        return fetch_per_gram(food_name, api_url, api_key)
+
+    result = nutrition_batcher.submit((food_name, api_url, api_key))
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+class NutritionCache:
+    """
+    Cache nutrisi per gram, key = nama makanan yang dinormalisasi.
+    Tier 1: LRU in-process. Tier 2: koleksi MongoDB nutrition_cache (TTL index di expires_at).
+    Miss yang bersamaan untuk makanan yang sama hanya memicu satu fetch (single-flight).
+    """
+
+    def __init__(self, maxsize, ttl, db_ttl_days):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.db_ttl = timedelta(days=db_ttl_days)
+        self.db_hits = 0
+        self.fetches = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._index_ready = False
+
+    def _collection(self):
+        return mongo.db.nutrition_cache
+
+    def _ensure_index(self):
+        if self._index_ready:
+            return
+        # Sama dengan definisi di index_service.INDEXES
+        self._collection().create_index("expires_at", name="expires_at_1", expireAfterSeconds=0)
+        self._index_ready = True
+
+    def _read_db(self, key):
+        try:
+            doc = self._collection().find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+                {"per_gram": 1}
+            )
+        except PyMongoError as e:
+            print(f"nutrition_cache read error: {e}")
+            return None
+        return doc['per_gram'] if doc else None
+
+    def _write_db(self, key, per_gram, source):
+        now = datetime.utcnow()
+        try:
+            self._ensure_index()
+            self._collection().update_one(
+                {"_id": key},
+                {"$set": {
+                    "per_gram": per_gram,
+                    "source": source,
+                    "updated_at": now,
+                    "expires_at": now + self.db_ttl
+                }},
+                upsert=True
+            )
+        except PyMongoError as e:
+            print(f"nutrition_cache write error: {e}")
+
+    def get(self, food_name, fetcher, source="calorieninjas"):
+        key = normalize_food_name(food_name)
+
+        per_gram = self.memory.get(key)
+        if per_gram is not None:
+            return per_gram
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            per_gram = self._read_db(key)
+            if per_gram is not None:
+                self.db_hits += 1
+            else:
+                self.fetches += 1
+                per_gram = fetcher(key)
+                self._write_db(key, per_gram, source)
+            self.memory.set(key, per_gram)
+            future.set_result(per_gram)
+            return per_gram
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "db_hits": self.db_hits,
+            "upstream_fetches": self.fetches,
+            "coalesced_misses": self.coalesced
+        }
+
+
+nutrition_cache = NutritionCache(
+    maxsize=Config.NUTRITION_CACHE_SIZE,
+    ttl=Config.NUTRITION_CACHE_TTL,
+    db_ttl_days=Config.NUTRITION_CACHE_DB_TTL_DAYS
+)
+
+
+def get_nutrition_per_gram(food_name, api_url, api_key):
+    return nutrition_cache.get(food_name, lambda key: fetch_per_gram_batched(key, api_url, api_key))
+
+
+# Urutan sumber nutrisi untuk analyze_food (NUTRITION_SOURCE_POLICY)
+#   remote_first: CalorieNinjas (cache), tabel lokal jika API gagal / tidak ada data
+#   local_first:  tabel lokal, CalorieNinjas jika tidak ada yang cocok
+#   local_only / remote_only: satu sumber saja
+NUTRITION_SOURCE_POLICIES = ["remote_first", "local_first", "local_only", "remote_only"]
+
+source_counts = {"local": 0, "calorieninjas": 0, "local_fallback": 0}
+_source_lock = threading.Lock()
+
+
+def _count_source(source):
+    with _source_lock:
+        source_counts[source] += 1
+
+
+def _lookup_local(food_name, food_name_display):
+    if local_food_db is None:
+        return None
+    found = local_food_db.lookup(food_name, food_name_display)
+    if found is None:
+        return None
+    per_gram, _ = found
+    return {field: per_gram.get(field, 0.0) for field in NUTRIENT_FIELDS}
+
+
+def resolve_nutrition_per_gram(food_name, food_name_display, api_url, api_key, policy=None):
+    """
+    Nilai nutrisi per gram sesuai policy sumber. Mengembalikan (per_gram, source)
+    dengan source "local" atau "calorieninjas".
+    """
+    policy = policy or Config.NUTRITION_SOURCE_POLICY
+    if policy not in NUTRITION_SOURCE_POLICIES:
+        raise ValidationError(f"NUTRITION_SOURCE_POLICY tidak valid: {policy}")
+
+    if policy in ("local_first", "local_only"):
+        per_gram = _lookup_local(food_name, food_name_display)
+        if per_gram is not None:
+            _count_source("local")
+            return per_gram, "local"
+        if policy == "local_only":
+            raise NoNutritionDataFound(f"Tidak ditemukan data nutrisi untuk '{food_name}'")
+
+    try:
+        per_gram = get_nutrition_per_gram(food_name, api_url, api_key)
+    except (requests.exceptions.RequestException, NutritionAPIFetchError, NoNutritionDataFound):
+        if policy != "remote_first":
+            raise
+        per_gram = _lookup_local(food_name, food_name_display)
+        if per_gram is None:
+            raise
+        _count_source("local_fallback")
+        return per_gram, "local"
+
+    _count_source("calorieninjas")
+    return per_gram, "calorieninjas"
+
+
+def nutrition_stats():
+    stats = nutrition_cache.stats()
+    stats["policy"] = Config.NUTRITION_SOURCE_POLICY
+    stats["sources"] = dict(source_counts)
+    stats["local"] = local_food_db.stats() if local_food_db is not None else None
+    if nutrition_batcher is not None:
+        stats["batching"] = nutrition_batcher.stats()
+        stats["batching"].update(combined_query_stats.as_dict())
+    return stats
@@ -0,0 +1,134 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo.errors import PyMongoError
+from app.services.cache import LRUCache
+
+
+class PlanStore:
+    """
+    Target per meal milik plan_id, dipakai ulang oleh /api/recommendation/replan.
+    Tier 1: LRU in-process. Tier 2: koleksi MongoDB (`collection()`, TTL index di expires_at),
+    jadi plan_id tetap valid di worker lain dan setelah entry LRU tergusur.
+
+    Respons hanya bergantung pada LRU: tulis ke MongoDB dikerjakan satu thread background,
+    sehingga MongoDB yang lambat/mati tidak menahan /api/recommendation. Jika tulis yang
+    mengantre sudah mencapai max_pending_writes, tulis baru dilewati (dihitung di dropped_writes).
+
+    Record plan: {"mode", "constraints": tuple hasil parse_constraints,
+                  "meals": {meal: (target kalori, {nutrisi: target})}}
+    """
+
+    def __init__(self, maxsize, ttl, collection, max_pending_writes):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.collection = collection
+        self.max_pending_writes = max_pending_writes
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plan-store")
+        self._pending_writes = 0
+        self._index_ready = False
+        self._lock = threading.Lock()
+        self.counters = {"saved": 0, "renewed": 0, "db_hits": 0, "store_errors": 0, "dropped_writes": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def _encode(record):
+        # Nama nutrisi bisa mengandung titik, jadi disimpan sebagai pasangan [nama, nilai]
+        return {
+            "mode": record["mode"],
+            "constraints": [list(item) for item in record["constraints"]],
+            "meals": {
+                meal: {"calories": cal, "nutrients": [[name, value] for name, value in nutrients.items()]}
+                for meal, (cal, nutrients) in record["meals"].items()
+            }
+        }
+
+    @staticmethod
+    def _decode(doc):
+        # Constraint kembali ke tuple supaya bisa dipakai sebagai key cache engine
+        return {
+            "mode": doc["mode"],
+            "constraints": tuple(tuple(item) for item in doc["constraints"]),
+            "meals": {
+                meal: (entry["calories"], {name: value for name, value in entry["nutrients"]})
+                for meal, entry in doc["meals"].items()
+            }
+        }
+
+    def _ensure_index(self):
+        if self._index_ready:
+            return
+        # Sama dengan definisi di index_service.INDEXES
+        self.collection().create_index("expires_at", name="expires_at_1", expireAfterSeconds=0)
+        self._index_ready = True
+
+    def _write(self, plan_id, record):
+        try:
+            self._ensure_index()
+            self.collection().update_one(
+                {"_id": plan_id},
+                {"$set": {
+                    **self._encode(record),
+                    "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)
+                }},
+                upsert=True
+            )
+        except PyMongoError as e:
+            # Plan tetap bisa dipakai di worker ini; worker lain akan menjawab plan_id tidak ditemukan
+            self._count("store_errors")
+            print(f"plan_store write error: {e}")
+        finally:
+            with self._lock:
+                self._pending_writes -= 1
+
+    def save(self, plan_id, record):
+        # saved_at dipakai touch() untuk menunda tulis ulang ke MongoDB
+        self.memory.set(plan_id, (record, time.monotonic()))
+        with self._lock:
+            self.counters["saved"] += 1
+            if self._pending_writes >= self.max_pending_writes:
+                self.counters["dropped_writes"] += 1
+                return
+            self._pending_writes += 1
+        self.writer.submit(self._write, plan_id, record)
+
+    def touch(self, plan_id, record):
+        """
+        Perpanjang masa berlaku plan_id yang dikembalikan ulang (mis. dari cache rekomendasi).
+        Ditulis ulang jika sudah tergusur dari LRU atau umurnya lewat setengah TTL,
+        sehingga plan_id di respons selalu valid minimal setengah TTL.
+        """
+        entry = self.memory.get(plan_id)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl / 2:
+            return
+        self.save(plan_id, record)
+        self._count("renewed")
+
+    def get(self, plan_id):
+        entry = self.memory.get(plan_id)
+        if entry is not None:
+            return entry[0]
+
+        try:
+            doc = self.collection().find_one({"_id": plan_id, "expires_at": {"$gt": datetime.utcnow()}})
+        except PyMongoError as e:
+            self._count("store_errors")
+            print(f"plan_store read error: {e}")
+            return None
+        if doc is None:
+            return None
+
+        record = self._decode(doc)
+        # Umur sisa di MongoDB tidak diketahui di sini, jadi touch() berikutnya menulis ulang
+        self.memory.set(plan_id, (record, time.monotonic() - self.ttl))
+        self._count("db_hits")
+        return record
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters, pending_writes=self._pending_writes)
+        return {"memory": self.memory.stats(), **counters}
@@ -0,0 +1,199 @@
+import re
+import numpy as np
+from app.errors.exceptions import ValidationError
+
+# Kata kunci dicocokkan ke nama resep asli (kolom `food`, bahasa Inggris) per kata utuh
+# atau per frasa; nama tampilan `food_id` hasil terjemahan mesin tidak dipakai untuk tag.
+# Daftar sengaja lebar: lebih baik resep tanpa daging ikut tersaring daripada resep daging lolos.
+MEAT_WORDS = {
+    "meat", "beef", "veal", "pork", "lamb", "mutton", "goat", "chicken", "turkey", "duck",
+    "goose", "quail", "pheasant", "squab", "pigeon", "ostrich", "emu", "caribou", "bison",
+    "venison", "rabbit", "poultry", "ham", "bacon", "sausage", "salami", "bologna", "pepperoni",
+    "pastrami", "mortadella", "yachtwurst", "scrapple", "frankfurters", "franks", "hotdog",
+    "corned", "brisket", "jerky", "meatballs", "meatloaf", "loaf", "mince", "steak", "steaks",
+    "rib", "ribs", "backribs", "spareribs", "chuck", "sirloin", "tenderloin", "porterhouse",
+    "loin", "shank", "foreshank", "shoulder", "hocks", "breast", "thigh", "drumstick",
+    "drumsticks", "wing", "wings", "liver", "heart", "kidneys", "tongue", "brain", "lungs",
+    "spleen", "splean", "pancreas", "thymus", "tripe", "giblets", "gizzard", "chitterlings",
+    "backfat", "lard", "tallow", "gelatin", "marshmallow", "broth", "stock", "bouillon",
+    "consomme", "jus", "gravy", "pepperpot", "stockpot", "burger", "hamburger", "cheeseburger", "whopper",
+    "mcchicken", "mcnuggets", "blt", "carne", "cerdo", "gatto"
+}
+MEAT_PHRASES = [
+    "hot dog", "corn dog", "cold cuts", "big mac", "big n tasty", "quarter pounder", "taco bell",
+    "taco salad", "wonton soup", "egg drop soup", "hot sour soup", "chinese egg roll",
+    "scotch broth", "chili with beans", "chili without beans"
+]
+SEAFOOD_WORDS = {
+    "fish", "seafood", "anchovy", "sardine", "sardines", "herring", "mackerel", "salmon",
+    "tuna", "skipjack", "yellowfin", "bluefin", "chinook", "coho", "chum", "sockeye", "cod",
+    "lingcod", "ling", "haddock", "halibut", "pollock", "mullet", "monkfish", "walleye", "pike",
+    "burbot", "cusk", "croaker", "scup", "shad", "whitefish", "cisco", "yellowtail", "trout",
+    "seatrout", "carp", "catfish", "eel", "swordfish", "tilapia", "flounder", "shark",
+    "sturgeon", "turbot", "grouper", "snapper", "sablefish", "pompano", "menhaden", "milkfish",
+    "bluefish", "butterfish", "whiting", "tilefish", "sheepshead", "rockfish", "roughy",
+    "wolffish", "sunfish", "dolphinfish", "bass", "perch", "smelt", "spot", "drum", "pout",
+    "sucker", "roe", "caviar", "surimi", "kippered", "gefilte", "shrimp", "crab", "dungeness",
+    "lobster", "spiny", "crayfish", "clam", "clams", "oyster", "mussels", "scallop",
+    "scallops", "conch", "whelk", "abalone", "squid", "cuttlefish", "octopus", "jellyfish",
+    "turtle", "caesar", "worcestershire"
+}
+# Frasa nabati yang memuat kata daging/ikan, dihapus sebelum pencocokan
+NON_MEAT_PHRASES = [
+    "duck sauce", "duck egg", "quail egg", "goat cheese", "pigeon peas", "coconut meat",
+    "oyster mushroom", "turtle beans", "hotdog roll"
+]
+PORK_WORDS = {
+    "pork", "ham", "bacon", "sausage", "salami", "bologna", "pepperoni", "mortadella",
+    "yachtwurst", "scrapple", "frankfurters", "franks", "hotdog", "spareribs", "backribs",
+    "hocks", "chitterlings", "backfat", "lard", "blt", "cerdo"
+}
+PORK_PHRASES = ["hot dog", "corn dog", "cold cuts", "wonton soup"]
+# Produk hewani non-daging (telur, susu, madu) serta kue/roti yang umumnya memakai
+# telur, mentega, atau susu
+ANIMAL_PRODUCT_WORDS = {
+    "egg", "eggs", "yolk", "eggnog", "omelet", "souffle", "custard", "flan", "meringue",
+    "mayonnaise", "wonton", "milk", "buttermilk", "butter", "cream", "creme", "cheese",
+    "cheddar", "brie", "camembert", "mozzarella", "parmesan", "ricotta", "feta", "gouda", "edam",
+    "colby", "muenster", "provolone", "romano", "roquefort", "gruyere", "fontina", "limburger",
+    "tilsit", "neufchatel", "cheshire", "asadero", "queso", "catupiry", "requeijao", "gjetost",
+    "yogurt", "yoghurt", "joghurt", "zaziki", "proteiinirahka", "danone", "leche", "whey",
+    "casein", "ghee", "glucerna", "slimfast", "parfait", "pudding", "mousse", "cappuccino",
+    "mashed", "gratin", "scalloped", "lasagna", "ranch", "goddess", "coleslaw", "honey",
+    "graham", "caramel", "caramels", "fudge", "toffee", "butterscotch", "nougat", "praline",
+    "brittle", "truffles", "snickers", "twix", "rolo", "milky", "brownie", "hushpuppies", "cake", "cakes", "cheesecake", "coffeecake", "fruitcake", "shortcake",
+    "cookie", "cookies", "shortbread", "gingerbread", "biscotti", "ladyfingers", "wafer",
+    "wafers", "croissant", "donut", "donuts", "cruller", "eclair", "muffin", "biscuit",
+    "pancake", "pancakes", "hotcakes", "mcgriddles", "mcmuffin", "waffle", "popover", "pastry",
+    "danish", "strudel", "pie", "zwieback"
+}
+ANIMAL_PRODUCT_PHRASES = [
+    "ice cream", "white chocolate", "chocolate coated", "white sauce", "tartar sauce",
+    "poppyseed dressing", "peppercorn dressing", "french toast", "banana bread", "garlic bread",
+    "cinnamon roll", "cinnamon rolls", "pain au chocolat", "kit kat", "m ms"
+]
+# Frasa nabati yang memuat kata produk hewani, dihapus sebelum pencocokan
+NON_ANIMAL_PHRASES = [
+    "peanut butter", "almond butter", "cashew butter", "sesame butter", "seed butter",
+    "apple butter", "cocoa butter", "nutmeg butter", "ucuhuba butter", "coconut milk",
+    "soy milk", "tofu yogurt", "soya vanille joghurt", "curd cheese", "cream of tartar",
+    "cream soda", "rice cake", "corn cake", "popcorn cake", "cracker cake"
+]
+# Nama yang eksplisit vegetarian (mis. "veggie burger", "meatless chicken") tidak dianggap daging
+VEGETARIAN_WORDS = {"vegetarian", "vegan", "veganz", "meatless", "veggie"}
+VEGAN_WORDS = {"vegan", "veganz"}
+RAW_WORDS = {"raw"}
+
+DIET_TAGS = ["vegetarian", "vegan", "pescatarian", "no_pork", "cooked"]
+
+# Parameter threshold -> (kolom dataset, arah). Satuan mengikuti dataset resep.
+NUTRIENT_CONSTRAINTS = {
+    "max_calories": ("Caloric Value", "max"),
+    "max_sugar": ("Sugars", "max"),
+    "max_sodium": ("Sodium", "max"),
+    "max_fat": ("Fat", "max"),
+    "max_saturated_fat": ("Saturated Fats", "max"),
+    "max_cholesterol": ("Cholesterol", "max"),
+    "max_carbs": ("Carbohydrates", "max"),
+    "min_protein": ("Protein", "min"),
+    "min_fiber": ("Dietary Fiber", "min")
+}
+
+
+def parse_constraints(data):
+    """
+    Validasi field `constraints` dari request rekomendasi.
+    Mengembalikan tuple yang bisa dipakai sebagai key cache, () jika tanpa constraint.
+    """
+    if data is None:
+        return ()
+    if not isinstance(data, dict):
+        raise ValidationError("constraints harus berupa object JSON")
+
+    unknown = set(data) - set(NUTRIENT_CONSTRAINTS) - {"diet"}
+    if unknown:
+        raise ValidationError(
+            f"constraint tidak dikenal: {sorted(unknown)}. "
+            f"Pilihan: diet, {', '.join(NUTRIENT_CONSTRAINTS)}"
+        )
+
+    diet = data.get("diet", [])
+    if isinstance(diet, str):
+        diet = [diet]
+    if not isinstance(diet, list) or any(tag not in DIET_TAGS for tag in diet):
+        raise ValidationError(f"diet harus berisi salah satu dari: {DIET_TAGS}")
+
+    parsed = [("diet", tag) for tag in sorted(set(diet))]
+    for name in NUTRIENT_CONSTRAINTS:
+        if name not in data:
+            continue
+        value = data[name]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValidationError(f"{name} harus berupa angka >= 0")
+        parsed.append((name, float(value)))
+    return tuple(parsed)
+
+
+class RecipeConstraintIndex:
+    """
+    Bitmap per meal untuk filter resep: mask tag diet dihitung sekali dari nama asli
+    resep saat load, kolom nutrisi untuk threshold disimpan sebagai array. Satu set
+    constraint menjadi AND dari mask-mask tersebut.
+    """
+
+    def __init__(self, labels, column, size):
+        self.size = size
+        texts = [" " + " ".join(re.findall(r"[a-z]+", str(labels[i]).lower())) + " " for i in range(size)]
+
+        def matching(words, phrases=(), ignored=()):
+            def hit(text):
+                for phrase in ignored:
+                    text = text.replace(f" {phrase} ", " ")
+                return bool(words.intersection(text.split())) or any(f" {p} " in text for p in phrases)
+            return np.fromiter((hit(text) for text in texts), dtype=bool, count=size)
+
+        explicit_veg = matching(VEGETARIAN_WORDS)
+        meat = matching(MEAT_WORDS, MEAT_PHRASES, NON_MEAT_PHRASES) & ~explicit_veg
+        seafood = matching(SEAFOOD_WORDS, ignored=NON_MEAT_PHRASES) & ~explicit_veg
+        pork = matching(PORK_WORDS, PORK_PHRASES, NON_MEAT_PHRASES) & ~explicit_veg
+        animal = matching(ANIMAL_PRODUCT_WORDS, ANIMAL_PRODUCT_PHRASES, NON_ANIMAL_PHRASES)
+
+        self.tag_masks = {
+            "vegetarian": ~meat & ~seafood,
+            "vegan": ~meat & ~seafood & (~animal | matching(VEGAN_WORDS)),
+            "pescatarian": ~meat,
+            "no_pork": ~pork,
+            "cooked": ~matching(RAW_WORDS)
+        }
+
+        self.columns = {}
+        for col, _ in NUTRIENT_CONSTRAINTS.values():
+            try:
+                # View memmap dari RecipeStore dipakai langsung (tanpa salinan per worker)
+                self.columns[col] = column(col)
+            except KeyError:
+                # Kolom tidak ada di dataset: threshold untuk kolom ini tidak menyaring apa pun
+                pass
+
+    def mask(self, constraints):
+        mask = np.ones(self.size, dtype=bool)
+        for name, value in constraints:
+            if name == "diet":
+                mask &= self.tag_masks[value]
+                continue
+            col, direction = NUTRIENT_CONSTRAINTS[name]
+            values = self.columns.get(col)
+            if values is None:
+                continue
+            mask &= values <= value if direction == "max" else values >= value
+        return mask
+
+    def candidates(self, constraints):
+        return np.flatnonzero(self.mask(constraints))
+
+    def private_bytes(self):
+        arrays = list(self.tag_masks.values()) + list(self.columns.values())
+        return int(sum(0 if isinstance(arr, np.memmap) else arr.nbytes for arr in arrays))
+
+    def tag_counts(self):
+        return {tag: int(mask.sum()) for tag, mask in self.tag_masks.items()}
@@ -0,0 +1,93 @@
+import hashlib
+import io
+import threading
+from app.services.cache import LRUCache
+from app.config.Config import Config
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow opsional: tanpa Pillow gambar dikirim apa adanya
+    Image = None
+
+
+class RecipeImageStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.preprocessed = 0
+        self.preprocess_skipped = 0
+        self.preprocess_errors = 0
+        self.bytes_in = 0
+        self.bytes_sent = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "preprocessed": self.preprocessed,
+                "preprocess_skipped": self.preprocess_skipped,
+                "preprocess_errors": self.preprocess_errors,
+                "bytes_in": self.bytes_in,
+                "bytes_sent": self.bytes_sent,
+                "bytes_saved": self.bytes_in - self.bytes_sent,
+                "pillow_available": Image is not None
+            }
+
+
+recipe_image_stats = RecipeImageStats()
+
+# Hasil OCR (list items) per sha256 isi gambar asli
+recipe_result_cache = LRUCache(maxsize=Config.RECIPE_IMAGE_CACHE_SIZE, ttl=Config.RECIPE_IMAGE_CACHE_TTL)
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def preprocess_image(content, filename, content_type):
+    """
+    Perkecil gambar besar ke sisi terpanjang RECIPE_IMAGE_MAX_SIDE dan encode ulang
+    sebagai JPEG. JPEG di-decode langsung di skala kecil (Image.draft) sehingga
+    memori tidak sebesar resolusi asli. Hasil hanya dipakai jika lebih kecil.
+    Mengembalikan (content, filename, content_type).
+    """
+    max_side = Config.RECIPE_IMAGE_MAX_SIDE
+    if Image is None or not Config.RECIPE_IMAGE_PREPROCESS or len(content) < Config.RECIPE_IMAGE_MIN_BYTES:
+        recipe_image_stats.add(preprocess_skipped=1)
+        return content, filename, content_type
+
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            if img.width * img.height > Config.RECIPE_IMAGE_MAX_PIXELS:
+                raise ValueError(f"gambar terlalu besar ({img.width}x{img.height})")
+
+            img.draft("RGB", (max_side, max_side))
+            if max(img.size) > max_side:
+                img.thumbnail((max_side, max_side))
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+
+            output = io.BytesIO()
+            img.save(output, format="JPEG", quality=Config.RECIPE_IMAGE_JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        recipe_image_stats.add(preprocess_errors=1)
+        print(f"Preprocess gambar resep gagal, kirim gambar asli: {e}")
+        return content, filename, content_type
+
+    processed = output.getvalue()
+    if len(processed) >= len(content):
+        recipe_image_stats.add(preprocess_skipped=1)
+        return content, filename, content_type
+
+    recipe_image_stats.add(preprocessed=1)
+    base = filename.rsplit(".", 1)[0] if filename else "image"
+    return processed, f"{base}.jpg", "image/jpeg"
@@ -0,0 +1,179 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo.errors import PyMongoError
+from app.extensions import mongo
+from app.errors.exceptions import QueueFullError
+from app.config.Config import Config
+
+# Field dokumen job yang dikirim ke client
+JOB_FIELDS = {"_id": 0, "id": 1, "status": 1, "created_at": 1, "started_at": 1,
+              "finished_at": 1, "result": 1, "error": 1}
+
+
+class RecipeJobQueue:
+    """
+    Antrian job analyze-recipe async.
+    Upload di-spool ke disk, lalu diproses worker pool terbatas sehingga OCR yang lambat
+    tidak menahan worker Flask. Jika job queued + running di proses ini sudah mencapai
+    max_pending, submit ditolak dengan QueueFullError (429).
+
+    Status & hasil job ditulis ke koleksi MongoDB (`collection()`), jadi polling bisa
+    dilayani worker/proses mana pun. Dokumen dihapus TTL index di expires_at, yang
+    diperpanjang result_ttl detik setiap kali status berubah.
+    """
+
+    def __init__(self, max_workers, max_pending, result_ttl, spool_dir, collection):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.spool_dir = spool_dir
+        self.collection = collection
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recipe-job")
+
+        # Job aktif (queued/running) milik proses ini, untuk backpressure
+        self._jobs = {}
+        self._index_ready = False
+        self._lock = threading.Lock()
+        self._queue_waits = deque(maxlen=1024)
+        self._run_times = deque(maxlen=1024)
+        self.counters = {
+            "submitted": 0,
+            "rejected": 0,
+            "done": 0,
+            "failed": 0,
+            "store_errors": 0
+        }
+
+    def _ensure_index(self):
+        if self._index_ready:
+            return
+        # Sama dengan definisi di index_service.INDEXES
+        self.collection().create_index("expires_at", name="expires_at_1", expireAfterSeconds=0)
+        self._index_ready = True
+
+    def _save(self, job_id, fields):
+        self._ensure_index()
+        fields["expires_at"] = datetime.utcnow() + timedelta(seconds=self.result_ttl)
+        self.collection().update_one({"_id": job_id}, {"$set": fields}, upsert=True)
+
+    def submit(self, image_file, user_id, handler):
+        """
+        Spool image_file (FileStorage) ke disk dan jadwalkan handler(filename, content, content_type).
+        handler dijalankan di thread worker; caller bertanggung jawab atas app context.
+        """
+        with self._lock:
+            if len(self._jobs) >= self.max_pending:
+                self.counters["rejected"] += 1
+                raise QueueFullError("Antrian analisis resep penuh, coba lagi nanti.")
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "id": job_id,
+                "user_id": user_id,
+                "status": "queued",
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+            self._jobs[job_id] = job
+            self.counters["submitted"] += 1
+
+        try:
+            # Dokumen job dibuat sebelum 202 dikirim, supaya polling pertama sudah menemukannya
+            self._save(job_id, dict(job))
+            os.makedirs(self.spool_dir, exist_ok=True)
+            fd, spool_path = tempfile.mkstemp(dir=self.spool_dir, suffix=".upload")
+            with os.fdopen(fd, "wb") as spool:
+                # FileStorage.save menyalin per chunk, upload tidak dibaca utuh ke memori
+                image_file.save(spool)
+        except Exception:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            raise
+
+        self.executor.submit(
+            self._run, job_id, spool_path, image_file.filename, image_file.content_type, handler
+        )
+        return job_id
+
+    def _update(self, job_id, fields):
+        try:
+            self._save(job_id, fields)
+        except PyMongoError as e:
+            with self._lock:
+                self.counters["store_errors"] += 1
+            print(f"Gagal menyimpan status job resep {job_id}: {e}")
+
+    def _run(self, job_id, spool_path, filename, content_type, handler):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            self._queue_waits.append(job["started_at"] - job["created_at"])
+        self._update(job_id, {"status": "running", "started_at": job["started_at"]})
+
+        try:
+            with open(spool_path, "rb") as spool:
+                content = spool.read()
+            result = handler(filename, content, content_type)
+            status, error = "done", None
+        except Exception as e:
+            result, status, error = None, "failed", {"type": type(e).__name__, "message": str(e)}
+        finally:
+            try:
+                os.remove(spool_path)
+            except OSError:
+                pass
+
+        finished_at = time.time()
+        self._update(job_id, {"status": status, "result": result, "error": error, "finished_at": finished_at})
+
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._run_times.append(finished_at - job["started_at"])
+            self.counters[status] += 1
+
+    def get(self, job_id, user_id):
+        """Status job milik user, atau None jika tidak ada / sudah kedaluwarsa / milik user lain."""
+        return self.collection().find_one(
+            {"_id": job_id, "user_id": user_id, "expires_at": {"$gt": datetime.utcnow()}},
+            JOB_FIELDS
+        )
+
+    def stats(self):
+        with self._lock:
+            statuses = [job["status"] for job in self._jobs.values()]
+            waits = list(self._queue_waits)
+            runs = list(self._run_times)
+            counters = dict(self.counters)
+
+        def avg_ms(values):
+            return round(sum(values) / len(values) * 1000, 2) if values else 0.0
+
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "counters": counters,
+            "avg_queue_wait_ms": avg_ms(waits),
+            "max_queue_wait_ms": round(max(waits) * 1000, 2) if waits else 0.0,
+            "avg_run_ms": avg_ms(runs)
+        }
+
+
+recipe_jobs = RecipeJobQueue(
+    max_workers=Config.RECIPE_JOB_WORKERS,
+    max_pending=Config.RECIPE_JOB_MAX_PENDING,
+    result_ttl=Config.RECIPE_JOB_RESULT_TTL,
+    spool_dir=Config.RECIPE_JOB_SPOOL_DIR,
+    collection=lambda: mongo.db.recipe_jobs
+)
@@ -0,0 +1,381 @@
+import numpy as np
+
+# Toleransi per nutrisi, sama dengan calculate_score lama di DietService
+NUTRIENT_PRIORITY = {'Protein': 0.15, 'Carbohydrates': 0.15, 'Fat': 0.15, 'default': 0.25}
+CALORIE_TOLERANCE = 0.15
+CALORIE_SCORE_TOLERANCE = 0.10
+COMBO_SIZES = [1, 2, 3]
+COMBO_WEIGHTS = [0.2, 0.3, 0.5]
+# Batas kandidat per ukuran kombinasi untuk mode sampled. Jika kombinasi di jendela
+# kalori lebih banyak dari ini, diambil sampel berjarak rata: hasilnya deterministik
+# tapi belum tentu kombinasi terbaik (lihat "exhaustive" di info pencarian).
+SAMPLED_MAX_CANDIDATES = 10000
+
+
+class RecipeSearchEngine:
+    """
+    Versi array dari pencarian kombinasi resep.
+    Kolom kalori dan nutrisi berupa array NumPy (n + 1,) dengan nol di index
+    terakhir sebagai padding untuk kombinasi yang isinya kurang dari 3 resep.
+    Dari RecipeStore kolom ini adalah view memmap float32 (tanpa salinan per
+    worker); dari DataFrame kolom disalin ke array float64.
+    """
+
+    def __init__(self, meal_df, nutrient_cols):
+        # meal_df bisa berupa DataFrame atau RecipeStore (array memory-mapped)
+        self.size = len(meal_df)
+        self.pad = self.size
+
+        if hasattr(meal_df, 'padded_column'):
+            column = meal_df.padded_column
+            self.names = meal_df.names
+        else:
+            column = lambda col: self._padded(meal_df[col].to_numpy())
+            names = meal_df['food_id'] if 'food_id' in meal_df.columns else meal_df['food']
+            self.names = names.to_numpy(dtype=object)
+        columns = set(meal_df.columns)
+
+        self.calories = column('Caloric Value')
+        self.protein = column('Protein')
+        self.carbs = column('Carbohydrates')
+        self.fat = column('Fat')
+
+        # Satu kolom per target nutrisi; None = kolom tidak ada di data (dianggap 0)
+        self.nutrient_cols = list(nutrient_cols)
+        self.nutrient_index = {col: i for i, col in enumerate(self.nutrient_cols)}
+        self.nutrient_columns = [column(col) if col in columns else None for col in self.nutrient_cols]
+        self._build_sorted_index()
+
+    def _build_sorted_index(self):
+        # Index kalori terurut untuk mode sampled (satu-satunya array privat engine penuh)
+        self.order = np.argsort(self.calories[:self.size], kind='stable')
+        self.sorted_cal = np.ascontiguousarray(self.calories[self.order], dtype=np.float64)
+
+    def private_bytes(self):
+        """Memori array milik engine ini (view memmap tidak dihitung karena dibagi antar worker)."""
+        arrays = [self.calories, self.protein, self.carbs, self.fat, self.order, self.sorted_cal]
+        arrays += [col for col in self.nutrient_columns if col is not None]
+        return int(sum(0 if isinstance(arr, np.memmap) else arr.nbytes for arr in arrays))
+
+    def subset(self, indices):
+        """
+        Engine baru yang hanya berisi resep di `indices` (index baris engine ini),
+        dipakai untuk pencarian dengan constraint: random draw dan index terurut
+        hanya mencakup kandidat yang lolos filter.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        rows = np.append(indices, self.pad)
+
+        sub = object.__new__(RecipeSearchEngine)
+        sub.size = len(indices)
+        sub.pad = sub.size
+        sub.names = [self.names[int(i)] for i in indices]
+        sub.calories = np.ascontiguousarray(self.calories[rows])
+        sub.protein = np.ascontiguousarray(self.protein[rows])
+        sub.carbs = np.ascontiguousarray(self.carbs[rows])
+        sub.fat = np.ascontiguousarray(self.fat[rows])
+        sub.nutrient_cols = self.nutrient_cols
+        sub.nutrient_index = self.nutrient_index
+        sub.nutrient_columns = [None if col is None else np.ascontiguousarray(col[rows]) for col in self.nutrient_columns]
+        sub._build_sorted_index()
+        return sub
+
+    def _padded(self, values):
+        return np.ascontiguousarray(np.append(np.asarray(values, dtype=np.float64), 0.0))
+
+    def _target_vectors(self, target_nutrients):
+        cols, values, tols = [], [], []
+        for nut, val in target_nutrients.items():
+            cols.append(self.nutrient_index.get(nut, -1))
+            values.append(val)
+            tols.append(NUTRIENT_PRIORITY.get(nut, NUTRIENT_PRIORITY['default']))
+        return np.array(cols, dtype=np.intp), np.array(values, dtype=np.float64), np.array(tols, dtype=np.float64)
+
+    def draw_combos(self, rng, max_attempts):
+        """Ambil max_attempts kombinasi acak sekaligus sebagai matriks index (attempts, 3)."""
+        if self.size == 0:
+            return np.empty((0, 3), dtype=np.intp)
+
+        sizes = rng.choice(COMBO_SIZES, size=max_attempts, p=COMBO_WEIGHTS)
+        # Kombinasi yang lebih besar dari jumlah resep dilewati, sama seperti ValueError di sample()
+        sizes = sizes[sizes <= self.size]
+
+        combos = rng.integers(0, self.size, size=(len(sizes), 3))
+        combos[np.arange(3)[None, :] >= sizes[:, None]] = self.pad
+
+        # Ambil ulang baris yang punya resep kembar (sample() tanpa replacement)
+        while True:
+            dup = self._duplicate_rows(combos)
+            if not dup.any():
+                break
+            redraw = rng.integers(0, self.size, size=(int(dup.sum()), 3))
+            redraw[np.arange(3)[None, :] >= sizes[dup][:, None]] = self.pad
+            combos[dup] = redraw
+        return combos
+
+    def _duplicate_rows(self, combos):
+        a, b, c = combos[:, 0], combos[:, 1], combos[:, 2]
+        return ((a == b) & (a != self.pad)) | ((a == c) & (a != self.pad)) | ((b == c) & (b != self.pad))
+
+    def combo_calories(self, combos):
+        return self.calories[combos].sum(axis=1, dtype=np.float64)
+
+    def in_window(self, total_cal, target_cal):
+        return (
+            (total_cal >= target_cal * (1 - CALORIE_TOLERANCE)) &
+            (total_cal <= target_cal * (1 + CALORIE_TOLERANCE))
+        )
+
+    def score(self, combos, target_cal, target_nutrients, total_cal=None):
+        """Hitung skor error kalori + nutrisi (rata-rata, 0 = sempurna) untuk setiap baris kombinasi."""
+        if total_cal is None:
+            total_cal = self.combo_calories(combos)
+
+        if target_cal != 0:
+            cal_err = np.abs(total_cal - target_cal) / target_cal
+        else:
+            cal_err = np.ones_like(total_cal)
+        total_score = np.minimum(cal_err / CALORIE_SCORE_TOLERANCE, 1.0)
+
+        cols, values, tols = self._target_vectors(target_nutrients)
+        if len(cols):
+            # Matriks (n + 1, k) sementara per panggilan; kolom tanpa data tetap 0
+            gathered = np.zeros((self.size + 1, len(cols)), dtype=np.float64)
+            for j, col in enumerate(cols):
+                if col >= 0 and self.nutrient_columns[col] is not None:
+                    gathered[:, j] = self.nutrient_columns[col]
+            # Jumlahkan per slot (tanpa array 3 dimensi)
+            total_nut = gathered[combos[:, 0]]
+            for slot in range(1, combos.shape[1]):
+                total_nut += gathered[combos[:, slot]]
+            safe_values = np.where(values != 0, values, 1.0)
+            err = np.where(values != 0, np.abs(total_nut - values) / safe_values, 1.0)
+            total_score += np.minimum(err / tols, 1.0).sum(axis=1)
+
+        return total_score / (len(cols) + 1)
+
+    def pick_best(self, combos, target_cal, target_nutrients):
+        """
+        Pilih kombinasi dengan skor terbaik di dalam jendela kalori +-15%,
+        atau kombinasi dengan kalori terdekat jika tidak ada yang masuk.
+        """
+        if len(combos) == 0:
+            return None
+
+        total_cal = self.combo_calories(combos)
+        in_window = self.in_window(total_cal, target_cal)
+        if not in_window.any():
+            return combos[int(np.argmin(np.abs(total_cal - target_cal)))]
+
+        # Skor nutrisi cukup dihitung untuk kombinasi yang masuk jendela kalori
+        candidates = combos[in_window]
+        scores = self.score(candidates, target_cal, target_nutrients, total_cal[in_window])
+        return candidates[int(np.argmin(scores))]
+
+    def random_search(self, target_cal, target_nutrients, max_attempts=5000, rng=None):
+        rng = rng if rng is not None else np.random.default_rng()
+        combos = self.draw_combos(rng, max_attempts)
+        info = {"mode": "random", "candidates_evaluated": int(len(combos))}
+        return self.pick_best(combos, target_cal, target_nutrients), info
+
+    def _extend(self, prefix, prefix_cal, lo, hi, budget, remaining=0):
+        """
+        Tambah satu resep ke setiap prefix (posisi di index terurut, naik).
+        Resep berikutnya harus berada setelah posisi terakhir prefix dan
+        kalorinya di [lo - prefix_cal, hi - prefix_cal], dicari dengan searchsorted.
+        Jika masih ada `remaining` resep lagi (kalorinya tidak lebih kecil karena
+        terurut), batas atasnya dibagi rata supaya prefix yang mustahil tidak dibuat.
+        Jika total kandidat melebihi budget, diambil sampel berjarak rata.
+        """
+        start = prefix[:, -1] + 1
+        if not remaining:
+            start = np.maximum(start, np.searchsorted(self.sorted_cal, lo - prefix_cal, side='left'))
+        stop = np.searchsorted(self.sorted_cal, (hi - prefix_cal) / (remaining + 1), side='right')
+        counts = np.maximum(stop - start, 0)
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty((0, prefix.shape[1] + 1), dtype=np.intp), True
+
+        exhaustive = total <= budget
+        if exhaustive:
+            flat = np.arange(total)
+        else:
+            # Langkahnya >= 1, jadi index tetap unik dan naik
+            flat = np.linspace(0, total - 1, budget).astype(np.intp)
+
+        ends = np.cumsum(counts)
+        owner = np.searchsorted(ends, flat, side='right')
+        offset = flat - (ends[owner] - counts[owner])
+        last = start[owner] + offset
+        return np.column_stack([prefix[owner], last]), exhaustive
+
+    def _sampled_candidates(self, target_cal, max_candidates):
+        """
+        Kombinasi 1, 2 dan 3 resep di dalam jendela kalori +-15% (matriks (m, 3)).
+        Semua kombinasi jika jumlahnya <= max_candidates per ukuran, selain itu sampel berjarak rata.
+        """
+        info = {"mode": "sampled", "candidates_evaluated": 0, "candidate_cap": max_candidates, "exhaustive": True}
+        lo = target_cal * (1 - CALORIE_TOLERANCE)
+        hi = target_cal * (1 + CALORIE_TOLERANCE)
+
+        found = []
+        for width in COMBO_SIZES:
+            if width > self.size:
+                break
+            # Mulai dari prefix kosong (posisi -1), tambah satu resep per langkah
+            combos = np.full((1, 1), -1, dtype=np.intp)
+            for remaining in range(width - 1, -1, -1):
+                combo_cal = self.sorted_cal[combos[:, 1:]].sum(axis=1)
+                combos, exhaustive = self._extend(combos, combo_cal, lo, hi, max_candidates, remaining)
+                info["exhaustive"] = info["exhaustive"] and exhaustive
+            if len(combos):
+                found.append(self._padded_combos(self.order[combos[:, 1:]]))
+
+        combos = np.vstack(found) if found else np.empty((0, 3), dtype=np.intp)
+        info["candidates_evaluated"] = int(len(combos))
+        return combos, info
+
+    def sampled_search(self, target_cal, target_nutrients, max_candidates=SAMPLED_MAX_CANDIDATES):
+        """
+        Kombinasi 1, 2 dan 3 resep dengan skor terbaik di antara kandidat dari
+        _sampled_candidates, tanpa sampling acak (deterministik). Hanya optimal jika
+        info["exhaustive"] bernilai True; jika tidak, sebagian kandidat dilewati.
+        """
+        if self.size == 0:
+            return None, {"mode": "sampled", "candidates_evaluated": 0, "candidate_cap": max_candidates, "exhaustive": True}
+
+        combos, info = self._sampled_candidates(target_cal, max_candidates)
+        if len(combos):
+            scores = self.score(combos, target_cal, target_nutrients)
+            return combos[int(np.argmin(scores))], info
+
+        return self._closest_fallback(target_cal), info
+
+    def ranked_combos(self, target_cal, target_nutrients, mode="random", max_attempts=5000, rng=None):
+        """
+        Kandidat kombinasi unik, urut dari yang terbaik: kombinasi di dalam jendela kalori
+        menurut skor, lalu sisanya menurut selisih kalori. Baris pertama sama dengan hasil
+        random_search/sampled_search; baris berikutnya dipakai untuk rencana multi-hari.
+        """
+        if self.size == 0:
+            return np.empty((0, 3), dtype=np.intp), {"mode": mode, "candidates_evaluated": 0}
+
+        if mode == "sampled":
+            # Posisi di index terurut selalu naik, jadi kombinasinya sudah unik
+            combos, info = self._sampled_candidates(target_cal, SAMPLED_MAX_CANDIDATES)
+            if not len(combos):
+                combos = self._fallback_options(target_cal)
+        else:
+            rng = rng if rng is not None else np.random.default_rng()
+            combos = self._unique_combos(self.draw_combos(rng, max_attempts))
+            info = {"mode": "random", "candidates_evaluated": int(len(combos))}
+
+        total_cal = self.combo_calories(combos)
+        in_window = self.in_window(total_cal, target_cal)
+
+        # Skor di jendela selalu <= 1, jadi kombinasi di luar jendela diberi 2 + selisih kalori
+        rank = np.empty(len(combos), dtype=np.float64)
+        rank[in_window] = self.score(combos[in_window], target_cal, target_nutrients, total_cal[in_window])
+        rank[~in_window] = 2 + np.abs(total_cal[~in_window] - target_cal) / max(abs(target_cal), 1e-9)
+        return combos[np.argsort(rank, kind='stable')], info
+
+    def _unique_combos(self, combos):
+        # Urutan resep dalam kombinasi tidak penting: urutkan per baris, lalu dedupe lewat key int64
+        combos = np.sort(combos, axis=1)
+        base = self.size + 1
+        keys = (combos[:, 0].astype(np.int64) * base + combos[:, 1]) * base + combos[:, 2]
+        _, first = np.unique(keys, return_index=True)
+        return combos[np.sort(first)]
+
+    def _padded_combos(self, combos):
+        padded = np.full((len(combos), 3), self.pad, dtype=np.intp)
+        padded[:, :combos.shape[1]] = combos
+        return padded
+
+    def _fallback_options(self, target_cal):
+        # Tidak ada yang masuk jendela: resep terdekat, atau 2/3 resep terbesar
+        pos = int(np.clip(np.searchsorted(self.sorted_cal, target_cal), 0, self.size - 1))
+        options = [self.order[[pos]]]
+        if pos > 0:
+            options.append(self.order[[pos - 1]])
+        for width in COMBO_SIZES[1:]:
+            if width <= self.size:
+                options.append(self.order[-width:])
+        return np.vstack([self._padded_combos(o[None, :]) for o in options])
+
+    def _closest_fallback(self, target_cal):
+        combos = self._fallback_options(target_cal)
+        return combos[int(np.argmin(np.abs(self.combo_calories(combos) - target_cal)))]
+
+    def to_records(self, combo):
+        if combo is None:
+            return []
+        results = []
+        for idx in combo:
+            if idx == self.pad:
+                continue
+            results.append({
+                "recipe_name": self.names[idx],
+                "calories": float(self.calories[idx]),
+                "protein": float(self.protein[idx]),
+                "carbs": float(self.carbs[idx]),
+                "fat": float(self.fat[idx])
+            })
+        return results
+
+
+class RepeatTracker:
+    """
+    Hitungan pemakaian resep untuk rencana multi-hari, dibagi oleh semua meal. Resep
+    dikunci per nama karena dataset breakfast/lunch/dinner memuat resep yang sama di
+    baris berbeda, jadi batas max_repeat berlaku untuk seluruh rencana, bukan per meal.
+    """
+
+    def __init__(self, max_repeat):
+        self.max_repeat = max_repeat
+        self.ids = {}
+        # Id 0 = slot padding, pemakaiannya selalu 0
+        self.usage = np.zeros(1, dtype=np.intp)
+        self.meals = {}
+
+    def add(self, meal, engine, ranked):
+        """Daftarkan kandidat terurut satu meal; index baris engine dipetakan ke id nama resep."""
+        keys = np.zeros(engine.size + 1, dtype=np.intp)
+        for row in np.unique(ranked[ranked != engine.pad]):
+            keys[row] = self.ids.setdefault(engine.names[row], len(self.ids) + 1)
+        if len(self.ids) + 1 > len(self.usage):
+            self.usage = np.concatenate([self.usage, np.zeros(len(self.ids) + 1 - len(self.usage), dtype=np.intp)])
+        self.meals[meal] = {"ranked": ranked, "keyed": keys[ranked], "pos": 0, "relaxed": 0}
+
+    def pick(self, meal):
+        """
+        Kombinasi terbaik untuk `meal` yang resepnya belum dipakai max_repeat kali di meal
+        mana pun, lalu catat pemakaiannya. Jika semua kandidat melanggar batas, dipilih
+        kombinasi dengan pemakaian ulang paling sedikit (dihitung di relaxed(meal)).
+        """
+        state = self.meals[meal]
+        ranked, keyed = state["ranked"], state["keyed"]
+        if len(ranked) == 0:
+            return None
+
+        # Pemakaian hanya bertambah, jadi kandidat sebelum `pos` tidak akan valid lagi
+        choice, pos = None, state["pos"]
+        while pos < len(keyed):
+            window = keyed[pos:pos + 256]
+            allowed = np.flatnonzero(self.usage[window].max(axis=1) < self.max_repeat)
+            if len(allowed):
+                choice = pos + int(allowed[0])
+                pos = choice
+                break
+            pos += len(window)
+        state["pos"] = pos
+        if choice is None:
+            choice = int(np.argmin(self.usage[keyed].max(axis=1)))
+            state["relaxed"] += 1
+
+        keys = keyed[choice]
+        np.add.at(self.usage, keys[keys != 0], 1)
+        return ranked[choice]
+
+    def relaxed(self, meal):
+        return self.meals[meal]["relaxed"]
@@ -0,0 +1,134 @@
+import json
+import os
+import numpy as np
+
+# Layout per meal (folder {meal}_store/):
+#   columns.npy        float32 (kolom, n + 1) - tiap kolom nutrisi contiguous, kolom terakhir
+#                      berisi nol sebagai padding kombinasi (dipakai langsung oleh RecipeSearchEngine)
+#   columns.json       nama kolom sesuai urutan baris di columns.npy
+#   names.bin          nama resep (utf-8) disambung tanpa pemisah
+#   names_offsets.npy  int64 (n + 1) - nama ke-i ada di names.bin[off[i]:off[i+1]]
+#   food.bin           nama asli (bahasa Inggris, kolom `food`) jika nama tampilan memakai food_id;
+#   food_offsets.npy   dipakai RecipeConstraintIndex untuk tag diet
+#   meta.json          versi layout + ukuran memori DataFrame pickle vs store (byte)
+
+# Store dengan versi lain dikonversi ulang dari pickle saat load
+LAYOUT_VERSION = 3
+
+
+def _write_text(store_dir, prefix, values):
+    """Tulis list string sebagai {prefix}.bin + {prefix}_offsets.npy; mengembalikan jumlah byte."""
+    encoded = [str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+
+    np.save(os.path.join(store_dir, f'{prefix}_offsets.npy'), offsets)
+    with open(os.path.join(store_dir, f'{prefix}.bin'), 'wb') as f:
+        f.write(b''.join(encoded))
+    return int(offsets.nbytes + offsets[-1])
+
+
+def convert_meal_dataset(pickle_path, store_dir):
+    """Ubah {meal}_data.pkl menjadi layout array yang bisa di-memory-map."""
+    import pandas as pd
+
+    df = pd.read_pickle(pickle_path)
+    numeric_cols = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+    matrix = np.zeros((len(numeric_cols), len(df) + 1), dtype=np.float32)
+    matrix[:, :len(df)] = df[numeric_cols].to_numpy(dtype=np.float32).T
+
+    name_col = 'food_id' if 'food_id' in df.columns else 'food'
+    label_col = 'food' if name_col != 'food' and 'food' in df.columns else None
+
+    os.makedirs(store_dir, exist_ok=True)
+    np.save(os.path.join(store_dir, 'columns.npy'), matrix)
+    text_bytes = _write_text(store_dir, 'names', df[name_col])
+    if label_col:
+        text_bytes += _write_text(store_dir, 'food', df[label_col])
+    with open(os.path.join(store_dir, 'columns.json'), 'w') as f:
+        json.dump(numeric_cols, f)
+
+    meta = {
+        "layout_version": LAYOUT_VERSION,
+        "rows": len(df),
+        "name_column": name_col,
+        "label_column": label_col,
+        "pickle_memory_bytes": int(df.memory_usage(deep=True).sum()),
+        "store_bytes": int(matrix.nbytes + text_bytes)
+    }
+    with open(os.path.join(store_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+class RecipeNames:
+    """Akses nama resep langsung dari names.bin (memory-mapped), di-decode per item."""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return bytes(self._blob[start:end]).decode('utf-8')
+
+
+class RecipeStore:
+    """
+    Dataset resep satu meal dalam bentuk array float32 yang di-memory-map.
+    Beberapa worker di host yang sama berbagi satu salinan di page cache, selama
+    pemakainya membaca view dari array ini (bukan salinan).
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.matrix = np.load(os.path.join(store_dir, 'columns.npy'), mmap_mode='r')
+
+        with open(os.path.join(store_dir, 'columns.json')) as f:
+            self.columns = json.load(f)
+        self._column_index = {col: i for i, col in enumerate(self.columns)}
+        with open(os.path.join(store_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        self.names = self._load_text('names')
+        # Nama asli untuk tag diet; sama dengan names jika dataset hanya punya kolom food
+        self.labels = self._load_text('food') if self.meta.get('label_column') else self.names
+
+    def _load_text(self, prefix):
+        offsets = np.load(os.path.join(self.store_dir, f'{prefix}_offsets.npy'), mmap_mode='r')
+        path = os.path.join(self.store_dir, f'{prefix}.bin')
+        if os.path.getsize(path):
+            blob = np.memmap(path, dtype=np.uint8, mode='r')
+        else:
+            blob = np.empty(0, dtype=np.uint8)
+        return RecipeNames(blob, offsets)
+
+    @staticmethod
+    def exists(store_dir):
+        meta_path = os.path.join(store_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path) as f:
+            return json.load(f).get('layout_version') == LAYOUT_VERSION
+
+    def __len__(self):
+        return self.matrix.shape[1] - 1
+
+    def column(self, name):
+        """View memmap kolom (n,) tanpa padding."""
+        return self.matrix[self._column_index[name], :-1]
+
+    def padded_column(self, name):
+        """View memmap kolom (n + 1,) dengan nol di index terakhir."""
+        return self.matrix[self._column_index[name]]
+
+    def memory_report(self):
+        # Hanya ukuran store (shared); memori privat per worker dilaporkan oleh pemakainya
+        return {
+            "rows": len(self),
+            "pickle_memory_bytes": self.meta['pickle_memory_bytes'],
+            "store_bytes": self.meta['store_bytes']
+        }
@@ -1,13 +1,36 @@
 import os
-import torch
-import joblib
-import pandas as pd
+import copy
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import random
-from app.ai_model import CaloriesModel, NutritionModel 
+from app.numpy_model import NumpyMLP
+from app.services.recipe_search import RecipeSearchEngine, RepeatTracker
+from app.services.recipe_store import RecipeStore, convert_meal_dataset
+from app.services.recipe_constraints import RecipeConstraintIndex, parse_constraints
+from app.services.cache import LRUCache
+from app.services.plan_store import PlanStore
+from app.services.micro_batcher import MicroBatcher
+from app.errors.exceptions import ValidationError, ModelNotReadyError
+from app.config.Config import Config
+from app.extensions import mongo
 
 class DietService:
-    def __init__(self):
+    SEARCH_MODES = ["random", "sampled"]
+    # Nama lama mode "sampled"; tetap diterima supaya client lama tidak rusak
+    MODE_ALIASES = {"exact": "sampled"}
+    INFERENCE_BACKENDS = ["torch", "numpy"]
+    # --- [UPDATE] FILTER 5 NUTRISI BERDASARKAN KOLOM DATA KAMU ---
+    # Nama harus SAMA PERSIS dengan header CSV/Dataset
+    PRIORITY_NUTRIENTS = ['Protein', 'Carbohydrates', 'Fat', 'Dietary Fiber', 'Sugars']
+
+    def __init__(self, load_mode=None):
+        """
+        load_mode "eager": load model di constructor (blocking, perilaku lama)
+        load_mode "background": load di thread saat start_loading() dipanggil
+        load_mode "lazy": load dipicu request pertama; request dijawab 503 sampai siap
+        """
         current_dir = os.path.dirname(os.path.abspath(__file__))
         app_dir = os.path.dirname(current_dir)
         self.artifacts_dir = os.path.join(app_dir, 'artifacts')
@@ -18,45 +41,278 @@ class DietService:
             "Very Active": 1.725
         }
 
-        self.load_models()
+        self.recommendation_cache = LRUCache(
+            maxsize=Config.RECOMMENDATION_CACHE_SIZE,
+            ttl=Config.RECOMMENDATION_CACHE_TTL
+        )
+
+        # plan_id -> target kalori & nutrisi per meal, dipakai ulang oleh replan_meal
+        self.plan_store = PlanStore(
+            maxsize=Config.PLAN_STORE_SIZE,
+            ttl=Config.PLAN_STORE_TTL,
+            collection=lambda: mongo.db.recommendation_plans,
+            max_pending_writes=Config.PLAN_STORE_MAX_PENDING_WRITES
+        )
+
+        # Worker pool untuk pencarian resep di endpoint batch
+        self.executor = ThreadPoolExecutor(max_workers=Config.RECOMMENDATION_BATCH_WORKERS)
+
+        # Micro-batching inference lintas request (opsional, dibuat di load_models)
+        self.inference_batchers = {}
+
+        # Engine pencarian per (meal, constraint) yang hanya berisi kandidat lolos filter
+        self.constrained_engines = LRUCache(maxsize=Config.CONSTRAINED_ENGINE_CACHE_SIZE)
+
+        self.meals = ['breakfast', 'lunch', 'dinner']
+
+        self.load_mode = load_mode or Config.MODEL_LOAD_MODE
+        self.load_state = "idle"
+        self.load_error = None
+        self.load_started_at = None
+        self.load_finished_at = None
+        self.artifact_timings = {}
+        self._ready = threading.Event()
+        self._load_lock = threading.Lock()
+        self._load_thread = None
+
+        if self.load_mode == "eager":
+            self.load_models()
+
+    def _load_torch_model(self, name, output_size=None):
+        # torch hanya di-import jika memang dibutuhkan
+        import torch
+        from app.ai_model import CaloriesModel, NutritionModel
+
+        if output_size is None:
+            model = CaloriesModel()
+        else:
+            model = NutritionModel(input_size=1, output_size=output_size)
+        model.load_state_dict(torch.load(os.path.join(self.artifacts_dir, f'{name}.pth')))
+        model.eval()
+        return model
+
+    def _load_model(self, name, output_size=None):
+        """
+        Backend "torch": nn.Module dari file .pth.
+        Backend "numpy": bobot dari {name}.npz (tanpa import torch); jika belum ada,
+        diekspor sekali dari state_dict model torch.
+        """
+        if Config.INFERENCE_BACKEND == "torch":
+            return self._load_torch_model(name, output_size)
+
+        npz_path = os.path.join(self.artifacts_dir, f'{name}.npz')
+        if os.path.exists(npz_path):
+            return NumpyMLP.load(npz_path)
+
+        model = NumpyMLP.from_state_dict(self._load_torch_model(name, output_size).state_dict())
+        try:
+            model.save(npz_path)
+        except OSError as e:
+            print(f"Gagal menyimpan {npz_path}: {e}")
+        return model
+
+    def _run_model(self, model, inputs_scaled):
+        if isinstance(model, NumpyMLP):
+            return model(inputs_scaled)
+
+        import torch
+        inputs_tensor = torch.tensor(inputs_scaled, dtype=torch.float32)
+        with torch.no_grad():
+            return model(inputs_tensor).numpy()
+
+    def check_backend_parity(self, samples=256, seed=0):
+        """
+        Bandingkan backend NumPy dengan torch (referensi) pada input acak
+        di ruang terskala. Mengembalikan selisih absolut maksimum per model.
+        """
+        rng = np.random.default_rng(seed)
+        checks = [('calories_model', None, 7)]
+        checks += [(f'{meal}_nutrient_model', len(self.meal_resources[meal]['targets']), 1) for meal in self.meals]
+
+        result = {}
+        for name, output_size, input_size in checks:
+            reference = self._load_torch_model(name, output_size)
+            candidate = NumpyMLP.from_state_dict(reference.state_dict())
+            inputs = rng.normal(0, 2, size=(samples, input_size)).astype(np.float32)
+            diff = np.abs(self._run_model(reference, inputs) - self._run_model(candidate, inputs))
+            result[name] = float(diff.max())
+        return result
+
+    def _load_recipe_pickle(self, meal):
+        import pandas as pd
+        return pd.read_pickle(os.path.join(self.artifacts_dir, f'{meal}_data.pkl'))
+
+    def _load_recipe_store(self, meal):
+        """Dataset resep sebagai array memory-mapped; dikonversi sekali dari pickle jika belum ada."""
+        store_dir = os.path.join(self.artifacts_dir, f'{meal}_store')
+        if not RecipeStore.exists(store_dir):
+            convert_meal_dataset(os.path.join(self.artifacts_dir, f'{meal}_data.pkl'), store_dir)
+        return RecipeStore(store_dir)
+
+    def recipe_memory_report(self):
+        """
+        Ukuran store bersama (page cache) + memori privat yang benar-benar dipegang
+        worker ini untuk index pencarian & constraint (tanpa engine hasil subset).
+        """
+        if not self._ready.is_set() or Config.RECIPE_DATA_FORMAT != "mmap":
+            return None
+
+        report = {}
+        for meal in self.meals:
+            res = self.meal_resources[meal]
+            entry = res['data'].memory_report()
+            entry["private_bytes_per_worker"] = {
+                "search_index": res['search'].private_bytes(),
+                "constraint_index": res['constraints'].private_bytes()
+            }
+            report[meal] = entry
+        return report
+
+    def _timed(self, artifact, loader):
+        # Catat durasi load per artifact untuk endpoint readiness
+        started = time.perf_counter()
+        value = loader()
+        self.artifact_timings[artifact] = round((time.perf_counter() - started) * 1000, 2)
+        return value
 
     def load_models(self):
         print("Loading AI Models...")
+        import joblib
+
+        with self._load_lock:
+            if self.load_state == "ready":
+                return
+            self.load_state = "loading"
+            self.load_error = None
+            self.load_started_at = time.time()
+            self.artifact_timings = {}
+
+        path = lambda name: os.path.join(self.artifacts_dir, name)
         try:
+            if Config.INFERENCE_BACKEND not in self.INFERENCE_BACKENDS:
+                raise ValueError(f"INFERENCE_BACKEND harus salah satu dari: {self.INFERENCE_BACKENDS}")
+
             # 1. Load Calories Model
-            self.calories_model = CaloriesModel()
-            self.calories_model.load_state_dict(torch.load(os.path.join(self.artifacts_dir, 'calories_model.pth')))
-            self.calories_model.eval()
+            self.calories_model = self._timed('calories_model', lambda: self._load_model('calories_model'))
             
-            self.calories_scaler_X = joblib.load(os.path.join(self.artifacts_dir, 'calories_scaler_X.pkl'))
-            self.gender_label_encoder = joblib.load(os.path.join(self.artifacts_dir, 'gender_label_encoder.pkl'))
-            y_params = joblib.load(os.path.join(self.artifacts_dir, 'calories_y_scaler_params.pkl'))
+            self.calories_scaler_X = self._timed('calories_scaler_X.pkl', lambda: joblib.load(path('calories_scaler_X.pkl')))
+            self.gender_label_encoder = self._timed('gender_label_encoder.pkl', lambda: joblib.load(path('gender_label_encoder.pkl')))
+            y_params = self._timed('calories_y_scaler_params.pkl', lambda: joblib.load(path('calories_y_scaler_params.pkl')))
             self.y_mean = y_params['mean']
             self.y_std = y_params['std']
 
             # 2. Load Meal Models
-            self.meals = ['breakfast', 'lunch', 'dinner']
             self.meal_resources = {} # Simpan model, scaler, data di dict ini
 
             for meal in self.meals:
-                targets = joblib.load(os.path.join(self.artifacts_dir, f'{meal}_targets.pkl'))
+                targets = self._timed(f'{meal}_targets.pkl', lambda: joblib.load(path(f'{meal}_targets.pkl')))
                 
-                model = NutritionModel(input_size=1, output_size=len(targets))
-                model.load_state_dict(torch.load(os.path.join(self.artifacts_dir, f'{meal}_nutrient_model.pth')))
-                model.eval()
+                model = self._timed(f'{meal}_nutrient_model', lambda: self._load_model(f'{meal}_nutrient_model', output_size=len(targets)))
+
+                if Config.RECIPE_DATA_FORMAT == "mmap":
+                    data = self._timed(f'{meal}_store', lambda: self._load_recipe_store(meal))
+                else:
+                    data = self._timed(f'{meal}_data.pkl', lambda: self._load_recipe_pickle(meal))
                 
+                search = self._timed(f'{meal}_search_index', lambda: RecipeSearchEngine(data, targets))
+                if hasattr(data, 'column'):
+                    column, labels = data.column, data.labels
+                else:
+                    column = lambda col: data[col].to_numpy()
+                    labels = data['food'].to_numpy(dtype=object) if 'food' in data.columns else search.names
+
                 self.meal_resources[meal] = {
                     'model': model,
-                    'scaler_X': joblib.load(os.path.join(self.artifacts_dir, f'{meal}_scaler_X.pkl')),
-                    'scaler_y': joblib.load(os.path.join(self.artifacts_dir, f'{meal}_scaler_y.pkl')),
+                    'scaler_X': self._timed(f'{meal}_scaler_X.pkl', lambda: joblib.load(path(f'{meal}_scaler_X.pkl'))),
+                    'scaler_y': self._timed(f'{meal}_scaler_y.pkl', lambda: joblib.load(path(f'{meal}_scaler_y.pkl'))),
                     'targets': targets,
-                    'data': pd.read_pickle(os.path.join(self.artifacts_dir, f'{meal}_data.pkl'))
+                    'data': data,
+                    # Kolom kalori & nutrisi sebagai array NumPy untuk pencarian resep
+                    'search': search,
+                    # Mask tag diet + kolom threshold untuk parameter constraints
+                    'constraints': self._timed(
+                        f'{meal}_constraint_index',
+                        lambda: RecipeConstraintIndex(labels, column, search.size)
+                    )
                 }
+                self.constrained_engines.clear()
+
+            # 3. Tabel target nutrisi (opsional), menggantikan forward pass per request
+            if Config.NUTRIENT_LUT_ENABLED:
+                self._timed('nutrient_luts', self._build_nutrient_luts)
+
+            if Config.INFERENCE_BACKEND == "numpy" and Config.INFERENCE_BACKEND_PARITY_CHECK:
+                parity = self._timed('backend_parity_check', self.check_backend_parity)
+                worst = max(parity.values())
+                if worst > Config.INFERENCE_BACKEND_PARITY_TOLERANCE:
+                    raise RuntimeError(f"Backend numpy berbeda dari torch: {parity}")
+                print(f"Backend parity OK (selisih maks {worst:.2e})")
+
+            # Micro-batching inference lintas request (opsional)
+            if Config.INFERENCE_BATCHING_ENABLED:
+                self._init_inference_batchers()
+
+            self.load_finished_at = time.time()
+            self.load_state = "ready"
+            self._ready.set()
             print("AI Models Loaded Successfully.")
         except Exception as e:
+            self.load_finished_at = time.time()
+            self.load_error = str(e)
+            self.load_state = "failed"
             print(f"Error loading models: {e}")
             raise e
 
+    def start_loading(self):
+        """Load model di background thread (tidak blocking). Aman dipanggil berkali-kali."""
+        with self._load_lock:
+            if self.load_state in ("loading", "ready") or self._load_thread is not None and self._load_thread.is_alive():
+                return
+            self.load_state = "loading"
+            self._load_thread = threading.Thread(target=self._load_in_background, name="diet-service-loader", daemon=True)
+            self._load_thread.start()
+
+    def _load_in_background(self):
+        try:
+            self.load_models()
+        except Exception:
+            # Error sudah dicatat di load_state / load_error
+            pass
+
+    def _require_ready(self):
+        if self._ready.is_set():
+            return
+        if self.load_state in ("idle", "failed"):
+            # Lazy mode: load pertama dipicu oleh request pertama; "failed" dicoba lagi
+            self.start_loading()
+        raise ModelNotReadyError("Model rekomendasi sedang dimuat, coba lagi sebentar.")
+
+    @property
+    def expected_artifacts(self):
+        """Jumlah langkah yang dicatat _timed pada load_models dengan Config saat ini."""
+        # 4 artifact model kalori + 7 per meal (targets, model, data, 2 scaler, index resep, bitmap constraint)
+        count = 4 + 7 * len(self.meals)
+        if Config.NUTRIENT_LUT_ENABLED:
+            count += 1
+        if Config.INFERENCE_BACKEND == "numpy" and Config.INFERENCE_BACKEND_PARITY_CHECK:
+            count += 1
+        return count
+
+    def status(self):
+        return {
+            "state": self.load_state,
+            "ready": self._ready.is_set(),
+            "progress": round(len(self.artifact_timings) / self.expected_artifacts, 2),
+            "artifacts_loaded": len(self.artifact_timings),
+            "artifacts_expected": self.expected_artifacts,
+            "artifact_timings_ms": dict(self.artifact_timings),
+            "load_time_ms": round((self.load_finished_at - self.load_started_at) * 1000, 2)
+                if self.load_finished_at and self.load_started_at else None,
+            "error": self.load_error,
+            "recipe_data_format": Config.RECIPE_DATA_FORMAT,
+            "recipe_memory": self.recipe_memory_report()
+        }
+
     def calculate_bmi(self, weight, height):
         if height <= 0: return None
         return weight / (height ** 2)
@@ -68,90 +324,250 @@ class DietService:
         else:
             return 447.593 + (9.247 * weight) + (3.098 * height_cm) - (4.330 * age)
 
+    def _predict_calories_batch(self, inputs_matrix):
+        # Satu kali transform scaler + satu forward pass untuk semua baris
+        inputs_scaled = self.calories_scaler_X.transform(inputs_matrix)
+        prediction = self._run_model(self.calories_model, inputs_scaled)[:, 0]
+        return prediction * self.y_std + self.y_mean
+
     def _predict_calories_raw(self, inputs):
         # Internal function
-        inputs_scaled = self.calories_scaler_X.transform([inputs])
-        inputs_tensor = torch.tensor(inputs_scaled, dtype=torch.float32)
-        with torch.no_grad():
-            prediction = self.calories_model(inputs_tensor).item()
-        return prediction * self.y_std + self.y_mean
+        return float(self._predict_calories_batch([inputs])[0])
+
+    def _predict_nutrients_batch(self, caloric_values, meal_name):
+        res = self.meal_resources[meal_name]
+        cal_scaled = res['scaler_X'].transform(np.asarray(caloric_values, dtype=np.float64).reshape(-1, 1))
+        pred = self._run_model(res['model'], cal_scaled)
+        return res['scaler_y'].inverse_transform(pred)
 
     def _predict_nutrients_raw(self, caloric_value, meal_name):
         # Internal function
-        res = self.meal_resources[meal_name]
-        cal_scaled = res['scaler_X'].transform([[caloric_value]])
-        cal_tensor = torch.tensor(cal_scaled, dtype=torch.float32)
-        with torch.no_grad():
-            pred = res['model'](cal_tensor).numpy()
-        return res['scaler_y'].inverse_transform(pred)[0]
-
-    def select_meal_recipes(self, meal_df, target_cal, target_nutrients, max_attempts=5000):
-        # Logika algoritma seleksi resep (sama seperti kode asli, hanya disesuaikan return value)
-        nutrient_priority = {'Protein': 0.15, 'Carbohydrates': 0.15, 'Fat': 0.15, 'default': 0.25}
-        
-        def calculate_score(actual_cal, actual_nut, target_c, target_n):
-            scores = []
-            cal_err = abs(actual_cal - target_c) / target_c if target_c != 0 else 1
-            scores.append(min(cal_err / 0.10, 1.0))
-            for nut, val in target_n.items():
-                actual = actual_nut.get(nut, 0)
-                tol = nutrient_priority.get(nut, nutrient_priority['default'])
-                err = abs(actual - val) / val if val != 0 else 1
-                scores.append(min(err / tol, 1.0))
-            return np.mean(scores)
-
-        best_score = float('inf')
-        best_combo = None
-        closest_cal_combo = None
-        min_cal_diff = float('inf')
-        
-        nutrient_cols = list(target_nutrients.keys())
-        tolerance = 0.15
-
-        for _ in range(max_attempts):
-            num = random.choices([1, 2, 3], weights=[0.2, 0.3, 0.5])[0]
-            try:
-                sample = meal_df.sample(n=num, replace=False)
-            except ValueError: continue
-            
-            total_cal = sample['Caloric Value'].sum()
-            
-            # Track closest calorie match as fallback
-            cal_diff = abs(total_cal - target_cal)
-            if cal_diff < min_cal_diff:
-                min_cal_diff = cal_diff
-                closest_cal_combo = sample
-
-            # Check logic
-            if (target_cal * (1 - tolerance)) <= total_cal <= (target_cal * (1 + tolerance)):
-                total_nut = sample[nutrient_cols].sum().to_dict()
-                score = calculate_score(total_cal, total_nut, target_cal, target_nutrients)
-                if score < best_score:
-                    best_score = score
-                    best_combo = sample
-
-        final_combo = best_combo if best_combo is not None else closest_cal_combo
-        
+        return self._infer_nutrients([caloric_value], meal_name)[0]
+
+    def _build_nutrient_luts(self):
+        """
+        Evaluasi NutritionModel tiap meal sekali di grid kalori yang rapat,
+        lalu cek deviasi interpolasi terhadap model di titik tengah grid.
+        Deviasi diukur dalam satuan standar (dibagi scale_ dari scaler_y).
+        """
+        step = Config.NUTRIENT_LUT_STEP
+        grid = np.arange(Config.NUTRIENT_LUT_MIN, Config.NUTRIENT_LUT_MAX + step / 2, step, dtype=np.float64)
+        midpoints = grid[:-1] + step / 2
+
+        for meal in self.meals:
+            res = self.meal_resources[meal]
+            res['lut'] = (grid, self._predict_nutrients_batch(grid, meal))
+
+            expected = self._predict_nutrients_batch(midpoints, meal)
+            deviation = np.abs(self._interpolate_lut(res['lut'], midpoints) - expected) / res['scaler_y'].scale_
+            max_deviation = float(deviation.max())
+            if max_deviation > Config.NUTRIENT_LUT_TOLERANCE:
+                raise RuntimeError(
+                    f"Tabel nutrisi {meal} menyimpang {max_deviation:.6f} dari model "
+                    f"(toleransi {Config.NUTRIENT_LUT_TOLERANCE})"
+                )
+            print(f"Nutrient LUT {meal}: {len(grid)} titik, deviasi maks {max_deviation:.6f}")
+
+    def _interpolate_lut(self, lut, caloric_values):
+        grid, table = lut
+        step = grid[1] - grid[0]
+        pos = (np.asarray(caloric_values, dtype=np.float64) - grid[0]) / step
+        left = np.clip(np.floor(pos).astype(np.intp), 0, len(grid) - 2)
+        frac = (pos - left)[:, None]
+        return table[left] * (1 - frac) + table[left + 1] * frac
+
+    def _init_inference_batchers(self):
+        max_batch = Config.INFERENCE_BATCH_MAX_SIZE
+        max_wait = Config.INFERENCE_BATCH_MAX_WAIT_MS / 1000
+
+        self.inference_batchers['calories'] = MicroBatcher(
+            'calories', lambda rows: list(self._predict_calories_batch(rows)), max_batch, max_wait
+        )
+        for meal in self.meals:
+            self.inference_batchers[meal] = MicroBatcher(
+                meal, lambda cals, meal=meal: list(self._predict_nutrients_batch(cals, meal)), max_batch, max_wait
+            )
+
+    def _infer_calories(self, inputs_matrix):
+        # Lewat scheduler jika aktif, supaya request yang bersamaan digabung jadi satu forward pass
+        batcher = self.inference_batchers.get('calories')
+        if batcher is None:
+            return self._predict_calories_batch(inputs_matrix)
+        return np.array(batcher.submit_many(inputs_matrix))
+
+    def _infer_nutrients(self, caloric_values, meal_name):
+        lut = self.meal_resources[meal_name].get('lut')
+        if lut is not None:
+            values = np.asarray(caloric_values, dtype=np.float64)
+            if values.min() >= lut[0][0] and values.max() <= lut[0][-1]:
+                return self._interpolate_lut(lut, values)
+
+        # Di luar rentang tabel (atau tabel tidak aktif): pakai model
+        batcher = self.inference_batchers.get(meal_name)
+        if batcher is None:
+            return self._predict_nutrients_batch(caloric_values, meal_name)
+        return np.vstack(batcher.submit_many(caloric_values))
+
+    def inference_stats(self):
+        return {name: batcher.stats() for name, batcher in self.inference_batchers.items()}
+
+    def search_meal(self, engine, target_cal, target_nutrients, max_attempts=5000, mode="random", rng=None):
+        # mode "random": semua kombinasi kandidat diambil sekaligus sebagai matriks index
+        # mode "sampled": pencarian rentang di index kalori terurut, kandidat dibatasi
+        # SAMPLED_MAX_CANDIDATES per ukuran kombinasi (optimal hanya jika info["exhaustive"])
+        if mode == "sampled":
+            best_combo, info = engine.sampled_search(target_cal, target_nutrients)
+        else:
+            best_combo, info = engine.random_search(target_cal, target_nutrients, max_attempts, rng)
+
         # Format output menjadi list of dict agar mudah jadi JSON
-        if final_combo is None: return []
-        
-        results = []
-        for _, row in final_combo.iterrows():
-            results.append({
-                "recipe_name": row.get('food_id', row['food']),
-                "calories": float(row['Caloric Value']),
-                "protein": float(row['Protein']),
-                "carbs": float(row['Carbohydrates']),
-                "fat": float(row['Fat'])
-            })
-        return results
+        return engine.to_records(best_combo), info
+
+    def _search_engine(self, meal_name, constraints):
+        """Engine penuh jika tanpa constraint, atau engine berisi kandidat yang lolos semua mask."""
+        res = self.meal_resources[meal_name]
+        if not constraints:
+            return res['search']
+
+        key = (meal_name, constraints)
+        engine = self.constrained_engines.get(key)
+        if engine is None:
+            engine = res['search'].subset(res['constraints'].candidates(constraints))
+            self.constrained_engines.set(key, engine)
+        return engine
+
+    def select_meal_recipes(self, meal_df, target_cal, target_nutrients, max_attempts=5000, engine=None,
+                            mode="random", rng=None):
+        if engine is None:
+            engine = RecipeSearchEngine(meal_df, target_nutrients.keys())
+
+        recipes, _ = self.search_meal(engine, target_cal, target_nutrients, max_attempts, mode, rng)
+        return recipes
+
+    def _quantize(self, value, bucket):
+        return round(round(float(value) / bucket) * bucket, 6)
+
+    def _recommendation_cache_key(self, data):
+        # Profil yang hampir sama (selisih di bawah ukuran bucket) memakai hasil yang sama
+        return (
+            self._quantize(data['age'], Config.RECOMMENDATION_CACHE_AGE_BUCKET),
+            self._quantize(data['weight'], Config.RECOMMENDATION_CACHE_WEIGHT_BUCKET),
+            self._quantize(data['height'], Config.RECOMMENDATION_CACHE_HEIGHT_BUCKET),
+            data['gender'],
+            data['activity_level'],
+            data['weight_goal'],
+            self.MODE_ALIASES.get(data.get('mode'), data.get('mode', 'random')),
+            data.get('seed'),
+            parse_constraints(data.get('constraints')),
+            data.get('days'),
+            data.get('max_repeat')
+        )
+
+    def cache_stats(self):
+        return self.recommendation_cache.stats()
 
     def process_recommendation(self, data):
         """
         Fungsi utama yang dipanggil oleh Route/Controller
         data: Dictionary dari input JSON
+        data['fresh'] = true akan melewati cache dan menghitung rencana baru
         """
+        self._require_ready()
+        profile = self._parse_profile(data)
+        key = self._recommendation_cache_key(data)
+
+        if not data.get('fresh'):
+            result = self._cached_result(key)
+            if result is not None:
+                return result
+
+        target = self._predict_targets([profile])[0]
+        result, record = self._plan_for(profile, *target)
+        self.recommendation_cache.set(key, (copy.deepcopy(result), record))
+        result['cached'] = False
+        return result
+
+    def _cached_result(self, key):
+        cached = self.recommendation_cache.get(key)
+        if cached is None:
+            return None
+        result, record = cached
+        # plan_id yang dikembalikan ulang harus tetap bisa dipakai untuk replan
+        self.plan_store.touch(result['plan_id'], record)
+        result = copy.deepcopy(result)
+        result['cached'] = True
+        return result
+
+    def process_recommendation_batch(self, profiles):
+        """
+        Rekomendasi untuk banyak profil sekaligus.
+        Model kalori dan model nutrisi tiap meal dijalankan sekali untuk semua profil,
+        lalu pencarian resep dibagi ke thread pool. Hasil urut sesuai input,
+        error dilaporkan per item.
+        """
+        self._require_ready()
+        if len(profiles) > Config.RECOMMENDATION_BATCH_MAX_SIZE:
+            raise ValidationError(f"Maksimal {Config.RECOMMENDATION_BATCH_MAX_SIZE} profil per batch")
+
+        results = [None] * len(profiles)
+        pending = []
+
+        for i, data in enumerate(profiles):
+            try:
+                if not isinstance(data, dict):
+                    raise ValidationError("Setiap profil harus berupa object JSON")
+                profile = self._parse_profile(data)
+                key = self._recommendation_cache_key(data)
+
+                result = None if data.get('fresh') else self._cached_result(key)
+                if result is not None:
+                    results[i] = {"index": i, "status": "success", "data": result}
+                else:
+                    pending.append((i, key, profile))
+            except Exception as e:
+                # Satu profil yang rusak tidak boleh menggagalkan seluruh batch
+                results[i] = {"index": i, "status": "error", "message": str(e)}
+
+        if pending:
+            targets = self._predict_targets([profile for _, _, profile in pending])
+            futures = [
+                self.executor.submit(self._plan_for, profile, *target)
+                for (_, _, profile), target in zip(pending, targets)
+            ]
+            for (i, key, _), future in zip(pending, futures):
+                try:
+                    result, record = future.result()
+                except Exception as e:
+                    results[i] = {"index": i, "status": "error", "message": str(e)}
+                    continue
+                self.recommendation_cache.set(key, (copy.deepcopy(result), record))
+                result['cached'] = False
+                results[i] = {"index": i, "status": "success", "data": result}
+
+        return results
+
+    def _parse_search_options(self, data, default_mode='random'):
+        mode = data.get('mode', default_mode)
+        mode = self.MODE_ALIASES.get(mode, mode)
+        if mode not in self.SEARCH_MODES:
+            raise ValidationError(f"mode tidak valid. Harus salah satu dari: {self.SEARCH_MODES}")
+        seed = data.get('seed')
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+            raise ValidationError("seed harus berupa bilangan bulat >= 0")
+        return mode, seed
+
+    def _parse_profile(self, data):
         # 1. Parse Input
+        required_fields = ['age', 'weight', 'height', 'gender', 'activity_level', 'weight_goal']
+        missing = [field for field in required_fields if field not in data]
+        if missing:
+            raise ValidationError(f"Field berikut wajib diisi: {', '.join(missing)}")
+
+        for field in ['age', 'weight', 'height']:
+            value = data[field]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not value > 0:
+                raise ValidationError(f"{field} harus berupa angka > 0")
+
         age = data['age']
         weight = data['weight']
         height = data['height']
@@ -159,84 +575,280 @@ class DietService:
         activity_str = data['activity_level']
         weight_goal = data['weight_goal']
 
+        if gender not in self.gender_label_encoder.classes_:
+            raise ValidationError(f"gender tidak valid. Harus salah satu dari: {list(self.gender_label_encoder.classes_)}")
+
+        mode, seed = self._parse_search_options(data)
+
+        constraints = parse_constraints(data.get('constraints'))
+
+        # days=N: rencana beberapa hari sekaligus; tanpa days respons tetap satu hari
+        days = data.get('days')
+        if days is not None and (isinstance(days, bool) or not isinstance(days, int)
+                                 or not 1 <= days <= Config.MEAL_PLAN_MAX_DAYS):
+            raise ValidationError(f"days harus berupa bilangan bulat 1 - {Config.MEAL_PLAN_MAX_DAYS}")
+        max_repeat = data.get('max_repeat', Config.MEAL_PLAN_MAX_REPEAT)
+        if isinstance(max_repeat, bool) or not isinstance(max_repeat, int) or max_repeat < 1:
+            raise ValidationError("max_repeat harus berupa bilangan bulat >= 1")
+
         activity_val = self.activity_level_map.get(activity_str, 1.2)
 
         # 2. Logic Perhitungan Dasar
         bmi = self.calculate_bmi(weight, height)
         bmr = self.calculate_bmr(age, weight, height, gender)
-        
-        gender_enc = self.gender_label_encoder.transform([gender])[0]
-        inputs = [age, weight, height, gender_enc, bmi, bmr, activity_val]
-        
-        tdee = self._predict_calories_raw(inputs)
-        
-        # Adjust Calorie
+
+        return {
+            "age": age,
+            "weight": weight,
+            "height": height,
+            "gender": gender,
+            "weight_goal": weight_goal,
+            "activity_val": activity_val,
+            "bmi": bmi,
+            "bmr": bmr,
+            "mode": mode,
+            "constraints": constraints,
+            "days": days,
+            "max_repeat": max_repeat,
+            "rng": np.random.default_rng(seed)
+        }
+
+    def _adjust_calories(self, tdee, gender, weight_goal):
         recommended_cal = tdee
         if weight_goal == "Lose Weight":
              min_limit = 1200 if gender == "F" else 1500
              recommended_cal = max(tdee - 500, min_limit)
         elif weight_goal == "Gain Weight":
             recommended_cal = tdee + 500
+        return recommended_cal
 
+    def _cal_distribution(self, recommended_cal):
         # 3. Bagi Kalori per Makan
         b_cal = recommended_cal * 0.25
         l_cal = recommended_cal * 0.31
         d_cal = recommended_cal * 0.35 # Sisa bisa untuk snack, logic aslinya 0.35 di dinner?
+        return {'breakfast': b_cal, 'lunch': l_cal, 'dinner': d_cal}
+
+    def _predict_targets(self, profiles):
+        """
+        Hitung TDEE, kalori rekomendasi dan target nutrisi per meal untuk semua profil.
+        Input semua profil ditumpuk jadi satu matriks, jadi tiap model cukup dijalankan sekali.
+        """
+        genders_enc = self.gender_label_encoder.transform([p['gender'] for p in profiles])
+        inputs_matrix = [
+            [p['age'], p['weight'], p['height'], gender_enc, p['bmi'], p['bmr'], p['activity_val']]
+            for p, gender_enc in zip(profiles, genders_enc)
+        ]
+        tdees = self._infer_calories(inputs_matrix)
+
+        recommended = [
+            self._adjust_calories(float(tdee), p['gender'], p['weight_goal'])
+            for p, tdee in zip(profiles, tdees)
+        ]
+        distributions = [self._cal_distribution(rec) for rec in recommended]
+
+        meal_nutrients = {
+            meal: self._infer_nutrients([dist[meal] for dist in distributions], meal)
+            for meal in self.meals
+        }
+
+        return [
+            (float(tdees[i]), recommended[i], distributions[i], {meal: meal_nutrients[meal][i] for meal in self.meals})
+            for i in range(len(profiles))
+        ]
+
+    def _meal_targets(self, meal_name, nutrients_arr):
+        target_keys = self.meal_resources[meal_name]['targets']
+
+        all_target_nutrients = {
+            target_keys[i]: float(nutrients_arr[i])
+            for i in range(len(target_keys))
+        }
+
+        # Filter Target Nutrisi (Output AI)
+        filtered_target_nutrients = {
+            k: v for k, v in all_target_nutrients.items()
+            if k in self.PRIORITY_NUTRIENTS
+        }
+        return all_target_nutrients, filtered_target_nutrients
+
+    def _format_recipes(self, recipes):
+        # Filter Output Resep juga (biar JSON resepnya gak kepanjangan)
+        filtered_recipes = []
+        for r in recipes:
+            recipe_data = {
+                "recipe_name": r['recipe_name'],
+                "calories": r['calories']
+            }
+            for nut in self.PRIORITY_NUTRIENTS:
+                if nut in r:
+                     recipe_data[nut] = r[nut]
+                # Note: Jika di select_meal_recipes kamu pakai row['Protein'], row['Fat'], maka kodenya aman.
+
+            filtered_recipes.append(recipe_data)
+        return filtered_recipes
+
+    def _meal_entry(self, cal_target, filtered_target_nutrients, recipes):
+        return {
+            "target_calories": float(round(cal_target, 2)),
+            "target_nutrients": {k: float(round(v, 2)) for k,v in filtered_target_nutrients.items()},
+            "recipes": self._format_recipes(recipes) # Gunakan resep yang sudah disaring
+        }
+
+    def _plan_summary(self, profile, tdee, recommended_cal):
+        return {
+            "bmi": float(round(profile['bmi'], 2)),
+            "bmr": float(round(profile['bmr'], 2)),
+            "tdee": float(round(tdee, 2)),
+            "recommended_calories": float(round(recommended_cal, 2))
+        }
+
+    def _plan_for(self, profile, *target):
+        if profile['days'] is None:
+            plan = self._build_plan(profile, *target)
+        else:
+            plan = self._build_multi_day_plan(profile, *target)
+        record = self._plan_record(profile, *target)
+        plan["plan_id"] = uuid.uuid4().hex
+        self.plan_store.save(plan["plan_id"], record)
+        return plan, record
+
+    def _plan_record(self, profile, tdee, recommended_cal, cal_distribution, meal_nutrients):
+        # Simpan target lengkap (bukan hanya 5 nutrisi di respons) supaya replan mencari dengan target yang sama
+        return {
+            "mode": profile['mode'],
+            "constraints": profile['constraints'],
+            "meals": {
+                meal_name: (float(cal_target), self._meal_targets(meal_name, meal_nutrients[meal_name])[0])
+                for meal_name, cal_target in cal_distribution.items()
+            }
+        }
+
+    def _parse_explicit_targets(self, data):
+        target_cal = data.get('target_calories')
+        if isinstance(target_cal, bool) or not isinstance(target_cal, (int, float)) or target_cal <= 0:
+            raise ValidationError("Tanpa plan_id, target_calories wajib diisi (angka > 0)")
+
+        target_nutrients = data.get('target_nutrients', {})
+        if not isinstance(target_nutrients, dict) or any(
+            isinstance(v, bool) or not isinstance(v, (int, float)) for v in target_nutrients.values()
+        ):
+            raise ValidationError("target_nutrients harus berupa object {nama nutrisi: angka}")
+        return float(target_cal), {k: float(v) for k, v in target_nutrients.items()}
+
+    def replan_meal(self, data):
+        """
+        Ganti resep satu meal tanpa menghitung ulang rencana: target diambil dari plan_id
+        (hasil /recommendation sebelumnya) atau dari target_calories/target_nutrients
+        di request, lalu hanya pencarian resep meal itu yang dijalankan ulang,
+        tanpa resep di `exclude`.
+        """
+        self._require_ready()
+
+        meal_name = data.get('meal')
+        if meal_name not in self.meals:
+            raise ValidationError(f"meal tidak valid. Harus salah satu dari: {self.meals}")
+
+        exclude = data.get('exclude', [])
+        if not isinstance(exclude, list) or any(not isinstance(name, str) for name in exclude):
+            raise ValidationError("exclude harus berupa list nama resep")
+
+        plan_id = data.get('plan_id')
+        if plan_id is not None:
+            stored = self.plan_store.get(plan_id)
+            if stored is None:
+                raise ValidationError("plan_id tidak ditemukan atau sudah kedaluwarsa, kirim target_calories dan target_nutrients")
+            cal_target, all_target_nutrients = stored["meals"][meal_name]
+            constraints = stored["constraints"]
+            mode, seed = self._parse_search_options(data, default_mode=stored["mode"])
+        else:
+            cal_target, all_target_nutrients = self._parse_explicit_targets(data)
+            constraints = parse_constraints(data.get('constraints'))
+            mode, seed = self._parse_search_options(data)
+
+        engine = self._search_engine(meal_name, constraints)
+        excluded = 0
+        if exclude:
+            skip = set(exclude)
+            keep = np.fromiter((name not in skip for name in engine.names), dtype=bool, count=engine.size)
+            excluded = engine.size - int(keep.sum())
+            if excluded:
+                engine = engine.subset(np.flatnonzero(keep))
+
+        recipes, search_info = self.search_meal(
+            engine, cal_target, all_target_nutrients, mode=mode, rng=np.random.default_rng(seed)
+        )
+        search_info["pool_size"] = engine.size
+        search_info["excluded"] = excluded
+
+        filtered_target_nutrients = {
+            k: v for k, v in all_target_nutrients.items() if k in self.PRIORITY_NUTRIENTS
+        }
+        entry = self._meal_entry(cal_target, filtered_target_nutrients, recipes)
+        entry["search"] = search_info
+        return {"plan_id": plan_id, "meal": meal_name, **entry}
 
+    def _build_plan(self, profile, tdee, recommended_cal, cal_distribution, meal_nutrients):
         # 4. Generate Menu untuk setiap waktu makan
         meal_plan = {}
-        cal_distribution = {'breakfast': b_cal, 'lunch': l_cal, 'dinner': d_cal}
-        
-        # --- [UPDATE] FILTER 5 NUTRISI BERDASARKAN KOLOM DATA KAMU ---
-        # Nama harus SAMA PERSIS dengan header CSV/Dataset
-        priority_nutrients = ['Protein', 'Carbohydrates', 'Fat', 'Dietary Fiber', 'Sugars'] 
 
         for meal_name, cal_target in cal_distribution.items():
-            nutrients_arr = self._predict_nutrients_raw(cal_target, meal_name)
-            target_keys = self.meal_resources[meal_name]['targets']
-            
-            all_target_nutrients = {
-                target_keys[i]: float(nutrients_arr[i]) 
-                for i in range(len(target_keys))
-            }
-            
-            # Filter Target Nutrisi (Output AI)
-            filtered_target_nutrients = {
-                k: v for k, v in all_target_nutrients.items() 
-                if k in priority_nutrients
-            }
-            
-            # Cari Resep
-            recipes = self.select_meal_recipes(
-                self.meal_resources[meal_name]['data'],
+            all_target_nutrients, filtered_target_nutrients = self._meal_targets(meal_name, meal_nutrients[meal_name])
+
+            # Cari Resep (hanya di antara resep yang lolos constraint)
+            engine = self._search_engine(meal_name, profile['constraints'])
+            recipes, search_info = self.search_meal(
+                engine,
                 cal_target,
-                all_target_nutrients # Tetap cari pakai data lengkap biar akurat
+                all_target_nutrients, # Tetap cari pakai data lengkap biar akurat
+                mode=profile['mode'],
+                rng=profile['rng']
             )
+            if profile['constraints']:
+                search_info["pool_size"] = engine.size
 
-            # Filter Output Resep juga (biar JSON resepnya gak kepanjangan)
-            filtered_recipes = []
-            for r in recipes:
-                recipe_data = {
-                    "recipe_name": r['recipe_name'],
-                    "calories": r['calories']
-                }
-                for nut in priority_nutrients:
-                    if nut in r: 
-                         recipe_data[nut] = r[nut]
-                    # Note: Jika di select_meal_recipes kamu pakai row['Protein'], row['Fat'], maka kodenya aman.
-                
-                filtered_recipes.append(recipe_data)
-            
-            meal_plan[meal_name] = {
-                "target_calories": float(round(cal_target, 2)),
-                "target_nutrients": {k: float(round(v, 2)) for k,v in filtered_target_nutrients.items()},
-                "recipes": filtered_recipes # Gunakan resep yang sudah disaring
-            }
+            meal_plan[meal_name] = self._meal_entry(cal_target, filtered_target_nutrients, recipes)
+            meal_plan[meal_name]["search"] = search_info
 
-        return {
-            "bmi": float(round(bmi, 2)),
-            "bmr": float(round(bmr, 2)),
-            "tdee": float(round(tdee, 2)),
-            "recommended_calories": float(round(recommended_cal, 2)),
-            "meal_plan": meal_plan
-        }
\ No newline at end of file
+        plan = self._plan_summary(profile, tdee, recommended_cal)
+        plan["meal_plan"] = meal_plan
+        return plan
+
+    def _build_multi_day_plan(self, profile, tdee, recommended_cal, cal_distribution, meal_nutrients):
+        """
+        Rencana untuk profile['days'] hari. Target per meal sama setiap hari, jadi kandidat
+        kombinasi cukup dicari dan diranking sekali per meal; tiap hari lalu mengambil
+        kombinasi terbaik yang resepnya belum dipakai max_repeat kali di seluruh rencana.
+        """
+        days, max_repeat = profile['days'], profile['max_repeat']
+        plans = [{"day": day + 1, "meal_plan": {}} for day in range(days)]
+        tracker = RepeatTracker(max_repeat)
+        search, meals = {}, {}
+
+        for meal_name, cal_target in cal_distribution.items():
+            all_target_nutrients, filtered_target_nutrients = self._meal_targets(meal_name, meal_nutrients[meal_name])
+
+            engine = self._search_engine(meal_name, profile['constraints'])
+            ranked, search_info = engine.ranked_combos(
+                cal_target, all_target_nutrients, mode=profile['mode'], rng=profile['rng']
+            )
+            tracker.add(meal_name, engine, ranked)
+
+            search_info["ranked_candidates"] = int(len(ranked))
+            if profile['constraints']:
+                search_info["pool_size"] = engine.size
+            search[meal_name] = search_info
+            meals[meal_name] = (engine, cal_target, filtered_target_nutrients)
+
+        # Hari demi hari, meal demi meal, supaya batas pengulangan terbagi rata antar meal
+        for day_plan in plans:
+            for meal_name, (engine, cal_target, filtered_target_nutrients) in meals.items():
+                day_plan["meal_plan"][meal_name] = self._meal_entry(
+                    cal_target, filtered_target_nutrients, engine.to_records(tracker.pick(meal_name))
+                )
+        for meal_name in meals:
+            search[meal_name]["relaxed_days"] = tracker.relaxed(meal_name)
+
+        plan = self._plan_summary(profile, tdee, recommended_cal)
+        plan.update({"days": days, "max_repeat": max_repeat, "plans": plans, "search": search})
+        return plan
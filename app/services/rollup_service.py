@@ -0,0 +1,234 @@
+import calendar
+import threading
+from datetime import datetime, date, timedelta
+from bson.objectid import ObjectId
+from pymongo import UpdateOne, ReplaceOne
+from pymongo.errors import PyMongoError, BulkWriteError
+from app.extensions import mongo
+from app.errors.exceptions import ValidationError
+from app.services.user_service import get_user_targets
+
+# Ringkasan mingguan (ISO week, "2026-W42") dan bulanan ("2026-10") per user.
+# _id = "<userId>:<period>" sehingga baca satu periode = satu find_one by _id.
+GRANULARITIES = {
+    "weekly": "weekly_summaries",
+    "monthly": "monthly_summaries"
+}
+
+SUMMARY_FIELDS = [
+    "total_calories_kcal",
+    "total_protein_g",
+    "total_fat_g",
+    "total_carbs_g"
+]
+
+# Field summary -> key target harian (lihat user_service.get_user_targets)
+TARGET_FIELDS = {
+    "total_calories_kcal": "calories",
+    "total_protein_g": "protein",
+    "total_fat_g": "fat",
+    "total_carbs_g": "carbs"
+}
+
+
+def week_period(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def month_period(day):
+    return f"{day.year}-{day.month:02d}"
+
+
+PERIOD_KEYS = {
+    "weekly": week_period,
+    "monthly": month_period
+}
+
+
+def period_range(granularity, period):
+    """(tanggal awal, tanggal akhir) inklusif untuk string periode."""
+    try:
+        if granularity == "weekly":
+            year, week = period.split("-W")
+            start = date.fromisocalendar(int(year), int(week), 1)
+            return start, start + timedelta(days=6)
+        year, month = (int(part) for part in period.split("-"))
+        return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    except (ValueError, AttributeError):
+        example = "2026-W42" if granularity == "weekly" else "2026-10"
+        raise ValidationError(f"period tidak valid, contoh format: {example}")
+
+
+def rollup_updates(user_id_obj, tanggal, inc):
+    """
+    Operasi $inc untuk rollup mingguan & bulanan dari satu write daily_logs.
+    `inc` memakai key yang sama dengan $inc summary harian ("summary.total_...").
+    """
+    updates = {}
+    for granularity, collection in GRANULARITIES.items():
+        period = PERIOD_KEYS[granularity](tanggal)
+        start, _ = period_range(granularity, period)
+        updates[collection] = UpdateOne(
+            {"_id": f"{user_id_obj}:{period}"},
+            {
+                "$inc": inc,
+                # Hari yang punya log (maksimal 7/31 entry) untuk rata-rata & adherence
+                "$addToSet": {"days": tanggal},
+                # Penanda write live, supaya backfill_rollups tidak menimpa/menghapus dokumen ini
+                "$currentDate": {"updated_at": True},
+                "$setOnInsert": {
+                    "userId": user_id_obj,
+                    "period": period,
+                    "period_start": datetime.combine(start, datetime.min.time())
+                }
+            },
+            upsert=True
+        )
+    return updates
+
+
+# Jumlah write rollup per hasil, untuk /api/health/metrics
+rollup_counters = {"applied": 0, "failed": 0}
+_counters_lock = threading.Lock()
+
+
+def apply_rollups(user_id_obj, tanggal, inc):
+    """
+    Dipanggil setelah write daily_logs berhasil. Kegagalan di sini tidak di-raise:
+    log harian sudah tersimpan, dan error ke client akan membuat makanan dicatat dua
+    kali saat dicoba ulang. Rollup yang tertinggal diperbaiki dengan `flask backfill-rollups`.
+    """
+    for collection, update in rollup_updates(user_id_obj, tanggal, inc).items():
+        try:
+            mongo.db[collection].bulk_write([update])
+            outcome = "applied"
+        except PyMongoError as e:
+            outcome = "failed"
+            print(f"Rollup {collection} gagal untuk {user_id_obj} {tanggal:%Y-%m-%d}, jalankan backfill-rollups: {e}")
+        with _counters_lock:
+            rollup_counters[outcome] += 1
+
+
+def rollup_stats():
+    with _counters_lock:
+        return dict(rollup_counters)
+
+
+def get_rollup(user_id, granularity, period=None, claims=None):
+    if granularity not in GRANULARITIES:
+        raise ValidationError(f"granularity tidak valid. Harus salah satu dari: {list(GRANULARITIES)}")
+
+    if not period:
+        period = PERIOD_KEYS[granularity](date.today())
+    start, end = period_range(granularity, period)
+
+    user_id_obj = ObjectId(user_id)
+    doc = mongo.db[GRANULARITIES[granularity]].find_one({"_id": f"{user_id_obj}:{period}"}) or {}
+    targets = get_user_targets(user_id, claims)
+
+    summary = doc.get("summary", {})
+    days_logged = len(doc.get("days", []))
+
+    totals = {}
+    daily_average = {}
+    daily_targets = {}
+    adherence = {}
+    for field in SUMMARY_FIELDS:
+        total = round(summary.get(field, 0), 2)
+        target_key = TARGET_FIELDS[field]
+        target = targets.get(target_key)
+        average = total / days_logged if days_logged else 0
+
+        totals[field] = total
+        daily_average[field] = round(average, 2)
+        daily_targets[target_key] = target
+        # Adherence dihitung dari hari yang punya log saja (hari tanpa log tidak dianggap 0)
+        adherence[target_key] = round(average / target * 100, 1) if target and days_logged else None
+
+    return {
+        "granularity": granularity,
+        "period": period,
+        "period_start": start.isoformat(),
+        "period_end": end.isoformat(),
+        "days_in_period": (end - start).days + 1,
+        "days_logged": days_logged,
+        "totals": totals,
+        "daily_average": daily_average,
+        "targets": daily_targets,
+        "adherence_pct": adherence
+    }
+
+
+def backfill_rollups(batch_size=1000):
+    """
+    Bangun ulang weekly_summaries & monthly_summaries dari daily_logs dengan
+    aggregation pipeline. Dokumen hasil rebuild diberi stempel rebuilt_at; setelah
+    semua tertulis, dokumen tanpa stempel run ini (periode yang tidak punya log lagi)
+    dihapus.
+
+    Dokumen yang menerima $inc live sejak run dimulai (updated_at >= rebuilt_at) tidak
+    ditimpa maupun dihapus, supaya increment yang masuk selama backfill tidak hilang;
+    jumlahnya dilaporkan sebagai skipped_live dan bisa dibangun ulang dengan run berikutnya.
+    """
+    rebuilt_at = datetime.utcnow()
+    # Cocok untuk dokumen tanpa updated_at atau yang terakhir diubah sebelum run ini
+    not_live = {"updated_at": {"$not": {"$gte": rebuilt_at}}}
+    group_keys = {
+        "weekly": {"year": {"$isoWeekYear": "$tanggal"}, "week": {"$isoWeek": "$tanggal"}},
+        "monthly": {"year": {"$year": "$tanggal"}, "month": {"$month": "$tanggal"}}
+    }
+
+    report = {}
+    for granularity, collection in GRANULARITIES.items():
+        group = {"_id": {"userId": "$userId", **group_keys[granularity]}, "days": {"$addToSet": "$tanggal"}}
+        for field in SUMMARY_FIELDS:
+            group[field] = {"$sum": {"$ifNull": [f"$summary.{field}", 0]}}
+
+        pipeline = [{"$match": {"tanggal": {"$type": "date"}}}, {"$group": group}]
+
+        ops = []
+        written = skipped = 0
+
+        def flush(ops):
+            # Filter not_live + upsert pada dokumen live gagal dengan duplicate key (11000): dilewati
+            try:
+                mongo.db[collection].bulk_write(ops, ordered=False)
+                return len(ops), 0
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if any(error.get("code") != 11000 for error in errors):
+                    raise
+                return len(ops) - len(errors), len(errors)
+
+        for row in mongo.db.daily_logs.aggregate(pipeline, allowDiskUse=True):
+            key = row["_id"]
+            if granularity == "weekly":
+                period = f"{key['year']}-W{key['week']:02d}"
+            else:
+                period = f"{key['year']}-{key['month']:02d}"
+            start, _ = period_range(granularity, period)
+
+            ops.append(ReplaceOne(
+                {"_id": f"{key['userId']}:{period}", **not_live},
+                {
+                    "userId": key["userId"],
+                    "period": period,
+                    "period_start": datetime.combine(start, datetime.min.time()),
+                    "days": sorted(row["days"]),
+                    "summary": {field: round(row[field], 2) for field in SUMMARY_FIELDS},
+                    "rebuilt_at": rebuilt_at
+                },
+                upsert=True
+            ))
+            if len(ops) >= batch_size:
+                done, live = flush(ops)
+                written, skipped = written + done, skipped + live
+                ops = []
+        if ops:
+            done, live = flush(ops)
+            written, skipped = written + done, skipped + live
+
+        stale = mongo.db[collection].delete_many({"rebuilt_at": {"$ne": rebuilt_at}, **not_live}).deleted_count
+        report[collection] = {"written": written, "deleted": stale, "skipped_live": skipped}
+    return report
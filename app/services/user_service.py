@@ -1,13 +1,33 @@
+import copy
+import threading
+import time
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 from app.extensions import mongo
 from app.errors.exceptions import ValidationError
+from app.services.cache import LRUCache
+from app.config.Config import Config
+
+# Profil yang sudah dibentuk (get_user_profile) + profile_version, key = user id.
+# Invalidasi eksplisit di update_user_profile; worker lain mengikuti TTL.
+profile_cache = LRUCache(maxsize=Config.PROFILE_CACHE_SIZE, ttl=Config.PROFILE_CACHE_TTL)
+
+# profile_version terbaru yang pernah dilihat worker ini, untuk menolak claim JWT yang basi.
+# Dibatasi LRU; user yang terlempar dari sini diperlakukan seperti belum pernah dilihat.
+_known_versions = LRUCache(maxsize=Config.PROFILE_VERSION_CACHE_SIZE)
+_versions_lock = threading.Lock()
+
+TARGET_KEYS = ["calories", "protein", "fat", "carbs"]
+
+
+def _remember_version(user_id, version):
+    with _versions_lock:
+        known = _known_versions.get(user_id)
+        if known is None or version > known:
+            _known_versions.set(user_id, version)
 
-def get_user_profile(user_id):
-    user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
-    
-    if not user:
-        raise ValidationError("User tidak ditemukan")
 
+def _shape_profile(user):
     profile = user.get('profile', {})
     targets = user.get('targets', {})
 
@@ -24,10 +44,61 @@ def get_user_profile(user_id):
         }
     }
 
+
+def _load_profile(user_id):
+    cached = profile_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    user = mongo.db.users.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+
+    if not user:
+        raise ValidationError("User tidak ditemukan")
+
+    entry = {"profile": _shape_profile(user), "version": user.get('profile_version', 0)}
+    profile_cache.set(user_id, entry)
+    _remember_version(user_id, entry["version"])
+    return entry
+
+
+def get_user_profile(user_id):
+    return copy.deepcopy(_load_profile(user_id)["profile"])
+
+
+def profile_claims(user):
+    """Claim JWT ringkas: versi profil + target [calories, protein, fat, carbs]."""
+    targets = _shape_profile(user)["targets"]
+    return {
+        "pv": user.get('profile_version', 0),
+        "tgt": [targets[key] for key in TARGET_KEYS]
+    }
+
+
+def get_user_targets(user_id, claims=None):
+    """
+    Target harian user. Urutan: cache profil, lalu claim JWT (jika ada, worker ini
+    sudah pernah melihat profile_version user, versi claim tidak lebih lama, dan token
+    belum lebih tua dari PROFILE_CLAIM_MAX_AGE), terakhir MongoDB. Worker yang belum
+    tahu versinya (baru start) memuat dari MongoDB dulu, jadi tidak menerima claim basi.
+    """
+    cached = profile_cache.get(user_id)
+    if cached is not None:
+        return dict(cached["profile"]["targets"])
+
+    if claims and "tgt" in claims and "pv" in claims:
+        fresh = time.time() - claims.get("iat", 0) <= Config.PROFILE_CLAIM_MAX_AGE
+        with _versions_lock:
+            known = _known_versions.get(user_id)
+        if fresh and known is not None and claims["pv"] >= known:
+            return dict(zip(TARGET_KEYS, claims["tgt"]))
+
+    return dict(_load_profile(user_id)["profile"]["targets"])
+
+
 def update_user_profile(user_id, data):
     user_obj = ObjectId(user_id)
 
-    
+
     update_data = {
         "profile.nama_lengkap": data.get('nama_lengkap'),
         "profile.berat_badan_kg": int(data.get('berat_badan_kg', 0)),
@@ -38,9 +109,15 @@ def update_user_profile(user_id, data):
         "targets.carbs": int(data.get('carbs', 0))
     }
 
-    mongo.db.users.update_one(
+    user = mongo.db.users.find_one_and_update(
         {"_id": user_obj},
-        {"$set": update_data}
+        {"$set": update_data, "$inc": {"profile_version": 1}},
+        projection={"password": 0},
+        return_document=ReturnDocument.AFTER
     )
-    
-    return "Profil berhasil diperbarui"
+
+    profile_cache.delete(user_id)
+    if user:
+        _remember_version(user_id, user.get('profile_version', 0))
+
+    return "Profil berhasil diperbarui", user